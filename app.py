@@ -1,17 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from flask_mysqldb import MySQL
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
+from markupsafe import Markup
+from db_pool import PooledMySQL, PoolTimeout
+import sql_metrics
+import telemetry
 import MySQLdb.cursors
 from dotenv import load_dotenv
 import os
-import requests
 import json
 from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
 from datetime import datetime
 import re
+from providers import fan_out, format_timings
+from response_cache import external_cache, fetch_json
+from catalog_search import search_clause
+from pagination import decode_cursor, keyset_clause, split_page
+from ingest import upsert_external_books
+from books import search_google_books, get_book_details
+from catalog_cache import catalog_version, cached_fragment, category_registry
+import stats
+from exports import EXPORTS, FORMATS, export_query, stream_export
+from checkout import place_purchase, place_borrow
+import cart as cart_service
+from covers import InvalidCover, cover_pipeline
+from cover_proxy import cover_proxy
+import http_cache
 
 # Load environment variables
 load_dotenv()
@@ -24,16 +39,53 @@ app.config['MYSQL_USER'] = os.getenv('MYSQL_USER')
 app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD')
 app.config['MYSQL_DB'] = os.getenv('MYSQL_DB')
 
+# Connection pool configurations
+app.config['MYSQL_POOL_MIN_SIZE'] = int(os.getenv('MYSQL_POOL_MIN_SIZE', 2))
+app.config['MYSQL_POOL_MAX_SIZE'] = int(os.getenv('MYSQL_POOL_MAX_SIZE', 10))
+app.config['MYSQL_POOL_MAX_LIFETIME'] = float(os.getenv('MYSQL_POOL_MAX_LIFETIME', 1800))
+app.config['MYSQL_POOL_WAIT_TIMEOUT'] = float(os.getenv('MYSQL_POOL_WAIT_TIMEOUT', 5))
+
+# Read replicas, as comma-separated host[:port] entries
+app.config['MYSQL_REPLICA_HOSTS'] = os.getenv('MYSQL_REPLICA_HOSTS', '')
+app.config['MYSQL_REPLICA_USER'] = os.getenv('MYSQL_REPLICA_USER')
+app.config['MYSQL_REPLICA_PASSWORD'] = os.getenv('MYSQL_REPLICA_PASSWORD')
+app.config['MYSQL_REPLICA_MAX_LAG'] = float(os.getenv('MYSQL_REPLICA_MAX_LAG', 5))
+
 # Session configuration
 app.secret_key = os.getenv('SECRET_KEY')
 
-# Initialize MySQL
-mysql = MySQL(app)
+# Initialize MySQL connection pool, filled lazily in each worker process
+mysql = PooledMySQL(app)
+
+# Per-request query counts, slow-query and repeated-query logging
+sql_metrics.init_app(app)
+
+# Request metrics and the /metrics endpoint
+telemetry.init_app(app)
+
+# gzip/brotli for larger text responses
+http_cache.init_app(app)
 
 # Upload folder configuration
 UPLOAD_FOLDER = 'static/uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Content-hashed covers and their resized variants, served with immutable cache headers
+cover_pipeline.init_app(app, mysql, os.path.join(UPLOAD_FOLDER, 'covers'))
+
+# Disk cache for hot-linked Open Library and Gutenberg covers, served at /covers/<book_id>
+cover_proxy.init_app(app, mysql, os.getenv('COVER_CACHE_DIR', 'cover_cache'))
+
+# External catalog configuration
+OPEN_LIBRARY_URL = "https://openlibrary.org/subjects/fiction.json?limit=4"
+GUTENBERG_URL = "https://gutendex.com/books"
+EXTERNAL_SEARCH_DEADLINE = float(os.getenv('EXTERNAL_SEARCH_DEADLINE', 3))
+external_executor = ThreadPoolExecutor(max_workers=int(os.getenv('EXTERNAL_SEARCH_WORKERS', 8)))
+
+# Page sizes
+BOOKS_PAGE_SIZE = int(os.getenv('BOOKS_PAGE_SIZE', 24))
+TRANSACTIONS_PAGE_SIZE = int(os.getenv('TRANSACTIONS_PAGE_SIZE', 50))
+
 # Admin required decorator
 def admin_required(f):
     @wraps(f)
@@ -47,98 +99,84 @@ def admin_required(f):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ['jpg', 'jpeg', 'png']
 
-def get_open_library_books():
+def remember_cart(summary):
+    # Keep the cart badge in the session so pages don't query for it
+    session['cart_count'] = summary['count']
+
+def current_catalog_version(*args, **kwargs):
+    # Catalog pages only change when a book or category write bumps this. Read
+    # from the primary: a lagging replica could hand out an older version
+    return catalog_version.current(mysql.primary_read_connection)
+
+def catalog_readable(version):
+    # Pages read from a replica that has not applied `version` must not be cached under it
+    return not mysql.reading_replica() or catalog_version.stored(mysql.read_connection) >= version
+
+@app.context_processor
+def inject_cart_count():
+    return {'cart_count': session.get('cart_count', 0)}
+
+def date_arg(name):
+    # Parse a YYYY-MM-DD query argument, ignoring missing or malformed values
     try:
-        url = "https://openlibrary.org/subjects/fiction.json?limit=4"
-        response = requests.get(url)
-        data = response.json()
+        return datetime.strptime(request.args.get(name, ''), '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def fetch_open_library_works(timeout=EXTERNAL_SEARCH_DEADLINE, retry=True):
+    data = fetch_json('openlibrary', OPEN_LIBRARY_URL, timeout=timeout, retry=retry)
+    return data.get('works', [])
+
+def fetch_gutenberg_results(timeout=EXTERNAL_SEARCH_DEADLINE, retry=True):
+    data = fetch_json('gutenberg', GUTENBERG_URL, timeout=timeout, retry=retry)
+    return data.get('results', [])
+
+def get_open_library_books(works=None):
+    try:
+        if works is None:
+            works = fetch_open_library_works()
         
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
         books = []
-        
-        for work in data.get('works', []):
-            # Check if book already exists
-            cursor.execute('SELECT id FROM books WHERE title = %s AND source = "openlibrary"',
-                         (work['title'],))
-            existing_book = cursor.fetchone()
+        for work in works:
+            # Get cover image if available
+            cover_id = work.get('cover_id')
+            cover_url = f"https://covers.openlibrary.org/b/id/{cover_id}-M.jpg" if cover_id else None
             
-            if not existing_book:
-                # Get cover image if available
-                cover_id = work.get('cover_id')
-                cover_url = f"https://covers.openlibrary.org/b/id/{cover_id}-M.jpg" if cover_id else None
-                
-                # Get authors
-                authors = ', '.join([author.get('name', 'Unknown') for author in work.get('authors', [])])
-                
-                # Insert into database
-                cursor.execute('''
-                    INSERT INTO books (title, authors, description, cover_image, preview_link, source) 
-                    VALUES (%s, %s, %s, %s, %s, "openlibrary")
-                ''', (
-                    work['title'],
-                    authors,
-                    work.get('description', ''),
-                    cover_url,
-                    f"https://openlibrary.org{work.get('key')}"
-                ))
-                mysql.connection.commit()
-                book_id = cursor.lastrowid
-            else:
-                book_id = existing_book['id']
-            
-            # Get book details
-            cursor.execute('SELECT * FROM books WHERE id = %s', (book_id,))
-            book = cursor.fetchone()
-            books.append(book)
+            books.append({
+                'title': work.get('title'),
+                'authors': ', '.join([author.get('name', 'Unknown') for author in work.get('authors', [])]),
+                'description': work.get('description', ''),
+                'cover_image': cover_url,
+                'preview_link': f"https://openlibrary.org{work.get('key')}"
+            })
         
+        # Store the whole batch in one transaction
+        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+        books = upsert_external_books(mysql.connection, cursor, 'openlibrary', books)
         cursor.close()
         return books
     except Exception as e:
         print(f"Error fetching Open Library books: {e}")
         return []
 
-def get_gutenberg_books():
+def get_gutenberg_books(results=None):
     try:
-        url = "https://gutendex.com/books"
-        response = requests.get(url)
-        data = response.json()
+        if results is None:
+            results = fetch_gutenberg_results()
         
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
         books = []
+        for book in results[:4]:
+            books.append({
+                'title': book.get('title', ''),
+                'authors': ', '.join([author.get('name', '') for author in book.get('authors', [])]),
+                'description': "A classic book from Project Gutenberg",
+                'cover_image': book.get('formats', {}).get('image/jpeg'),
+                'preview_link': book.get('formats', {}).get('text/html')
+            })
         
-        for book in data.get('results', [])[:4]:
-            title = book.get('title', '')
-            authors = ', '.join([author.get('name', '') for author in book.get('authors', [])])
-            description = f"A classic book from Project Gutenberg"
-            cover_image = book.get('formats', {}).get('image/jpeg')
-            preview_link = book.get('formats', {}).get('text/html')
-            
-            # Check if book already exists
-            cursor.execute('SELECT id FROM books WHERE title = %s AND source = "gutenberg"', (title,))
-            existing_book = cursor.fetchone()
-            
-            if not existing_book:
-                cursor.execute('''INSERT INTO books (
-                    title, authors, description, cover_image, preview_link, source
-                ) VALUES (%s, %s, %s, %s, %s, "gutenberg")''',
-                    (
-                        title,
-                        authors,
-                        description,
-                        cover_image,
-                        preview_link
-                    )
-                )
-                mysql.connection.commit()
-                book_id = cursor.lastrowid
-            else:
-                book_id = existing_book['id']
-            
-            # Get book details
-            cursor.execute('SELECT * FROM books WHERE id = %s', (book_id,))
-            book_details = cursor.fetchone()
-            books.append(book_details)
-        
+        # Store the whole batch in one transaction
+        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+        books = upsert_external_books(mysql.connection, cursor, 'gutenberg', books)
         cursor.close()
         return books
     except Exception as e:
@@ -146,28 +184,36 @@ def get_gutenberg_books():
         return []
 
 @app.route('/')
+@http_cache.conditional_page(current_catalog_version, catalog_readable)
 def home():
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    # Both blocks are cached per catalog version, so repeat hits skip the database
+    version = current_catalog_version()
+    cacheable = lambda: catalog_readable(version)
+    categories_html = cached_fragment('home_categories', version, render_home_categories, cacheable)
+    featured_html = cached_fragment('home_featured', version, render_home_featured, cacheable)
     
-    # Get all categories
-    cursor.execute('SELECT * FROM book_categories ORDER BY name')
-    categories = cursor.fetchall()
+    return render_template('dashboard.html', 
+                         categories_html=categories_html,
+                         featured_html=featured_html)
+
+def render_home_categories():
+    categories = category_registry.all(mysql.read_connection)
+    return Markup(render_template('partials/home_categories.html', categories=categories))
+
+def render_home_featured():
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     
     # Get featured books (latest 4 books)
     cursor.execute('''
-        SELECT b.*, c.name as category_name 
+        SELECT b.* 
         FROM books b 
-        LEFT JOIN book_categories c ON b.category_id = c.id
         ORDER BY b.created_at DESC 
         LIMIT 4
     ''')
-    featured_books = cursor.fetchall()
-    
+    featured_books = category_registry.attach_names(mysql.read_connection, cursor.fetchall())
     cursor.close()
     
-    return render_template('dashboard.html', 
-                         categories=categories,
-                         featured_books=featured_books)
+    return Markup(render_template('partials/home_featured.html', featured_books=featured_books))
 
 @app.route('/search')
 def search():
@@ -176,65 +222,88 @@ def search():
         return redirect(url_for('home'))
     
     try:
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+        cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
         
-        # Search in local database
-        search_term = f"%{query}%"
-        cursor.execute('''
-            SELECT * FROM books 
-            WHERE title LIKE %s 
-               OR authors LIKE %s 
-               OR description LIKE %s
+        # Search in local database, ranked by boosted FULLTEXT relevance
+        clause = search_clause(query)
+        cursor.execute(f'''
+            SELECT b.*, {clause.score_sql} as relevance
+            FROM books b
+            WHERE {clause.where_sql}
+            ORDER BY relevance DESC, b.created_at DESC
             LIMIT 20
-        ''', (search_term, search_term, search_term))
+        ''', tuple(clause.score_params + clause.where_params))
         local_results = cursor.fetchall()
         
-        # Get external results
+        # Get external results from all providers at once, bounded by the deadline
         external_results = []
+        provider_results = []
         if len(local_results) < 10:
-            external_results.extend(get_open_library_books())
-            if len(external_results) < 4:
-                external_results.extend(get_gutenberg_books())
+            # Single attempts: a retry could only finish after the deadline has passed
+            provider_results = fan_out(external_executor, {
+                'openlibrary': lambda timeout: fetch_open_library_works(timeout, retry=False),
+                'gutenberg': lambda timeout: fetch_gutenberg_results(timeout, retry=False),
+            }, EXTERNAL_SEARCH_DEADLINE)
+            print(f"External search timings: {format_timings(provider_results)}")
+            
+            # Store results on the request thread, which owns the MySQL connection
+            for result in provider_results:
+                if not result.ok:
+                    continue
+                if result.name == 'openlibrary':
+                    external_results.extend(get_open_library_books(result.data))
+                elif result.name == 'gutenberg':
+                    external_results.extend(get_gutenberg_books(result.data))
         
         cursor.close()
         return render_template('search.html', 
                              query=query,
                              local_results=local_results,
-                             external_results=external_results)
+                             external_results=external_results,
+                             provider_results=provider_results)
     except Exception as e:
         print(f"Search error: {e}")
         flash('An error occurred while searching', 'error')
         return redirect(url_for('home'))
 
 @app.route('/book/<int:book_id>')
+@http_cache.conditional_page(current_catalog_version, catalog_readable)
 def view_book(book_id):
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     
     # Get book details with category name
-    cursor.execute('''
-        SELECT b.*, c.name as category_name 
-        FROM books b 
-        LEFT JOIN book_categories c ON b.category_id = c.id 
-        WHERE b.id = %s
-    ''', (book_id,))
+    cursor.execute('SELECT b.* FROM books b WHERE b.id = %s', (book_id,))
     
     book = cursor.fetchone()
     if not book:
         flash('Book not found!', 'danger')
         return redirect(url_for('books'))
+    category_registry.attach_names(mysql.read_connection, [book])
     
     # Set default price if not set
     if 'price' not in book or book['price'] is None:
         book['price'] = 29.99  # Default price
     
-    # Get related books (same category)
+    # Precomputed content neighbours (see related_books.py)
     cursor.execute('''
-        SELECT * FROM books 
-        WHERE category_id = %s AND id != %s 
+        SELECT b.*
+        FROM related_books r
+        JOIN books b ON b.id = r.related_id
+        WHERE r.book_id = %s
+        ORDER BY r.position
         LIMIT 4
-    ''', (book['category_id'], book_id))
+    ''', (book_id,))
     related_books = cursor.fetchall()
     
+    # Books the job has not reached yet fall back to the same category
+    if not related_books:
+        cursor.execute('''
+            SELECT * FROM books 
+            WHERE category_id = %s AND id != %s 
+            LIMIT 4
+        ''', (book['category_id'], book_id))
+        related_books = cursor.fetchall()
+    
     cursor.close()
     return render_template('book.html', book=book, related_books=related_books)
 
@@ -264,6 +333,8 @@ def login():
             cursor.execute('UPDATE users SET last_login = NOW() WHERE id = %s', (user['id'],))
             mysql.connection.commit()
             
+            # Seed the navbar badge with any cart left from an earlier visit
+            remember_cart(cart_service.get_summary(cursor, user['id']))
             cursor.close()
             
             if user['is_admin']:
@@ -275,18 +346,36 @@ def login():
     
     return render_template('login.html')
 
+def get_recommendations(cursor, user_id, limit=8):
+    # Precomputed by recommendations.py, read with one primary-key range scan.
+    # Books borrowed or bought since the last run are dropped here
+    cursor.execute('''
+        SELECT b.id, b.title, b.authors, b.cover_image, b.cover_thumb, b.cover_thumb_webp
+        FROM user_recommendations r
+        JOIN books b ON b.id = r.book_id
+        WHERE r.user_id = %s
+          AND NOT EXISTS (SELECT 1 FROM purchased_books pb
+                          WHERE pb.user_id = r.user_id AND pb.book_id = r.book_id)
+          AND NOT EXISTS (SELECT 1 FROM borrowed_books bb
+                          WHERE bb.user_id = r.user_id AND bb.book_id = r.book_id)
+        ORDER BY r.position
+        LIMIT %s
+    ''', (user_id, limit))
+    return cursor.fetchall()
+
 @app.route('/dashboard')
 def dashboard():
     if not session.get('loggedin'):
         return redirect(url_for('login'))
     
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     
     # Get borrowed books
     cursor.execute('''
         SELECT b.id, b.title, b.authors, b.cover_image, b.description, b.category_id,
-               bb.id as borrow_id, bb.borrow_date, bb.return_date, bb.days_borrowed, 
-               bb.total_cost, bb.returned, bb.actual_return_date
+               bb.id as borrow_id, bb.borrow_date, bb.due_date, bb.return_date,
+               DATEDIFF(COALESCE(bb.return_date, NOW()), bb.borrow_date) as days_borrowed,
+               bb.return_date IS NOT NULL as returned
         FROM borrowed_books bb
         JOIN books b ON bb.book_id = b.id
         WHERE bb.user_id = %s
@@ -305,11 +394,13 @@ def dashboard():
     ''', (session['id'],))
     purchased_books = cursor.fetchall()
     
+    recommended_books = get_recommendations(cursor, session['id'])
     cursor.close()
     
     return render_template('dashboard.html',
                          borrowed_books=borrowed_books,
                          purchased_books=purchased_books,
+                         recommended_books=recommended_books,
                          now=datetime.now())
 
 @app.route('/logout')
@@ -337,6 +428,7 @@ def register():
             INSERT INTO users (username, password, email, created_at) 
             VALUES (%s, SHA2(%s, 256), %s, NOW())
         ''', (username, password, email))
+        stats.increment(cursor, stats.TOTAL_USERS)
         mysql.connection.commit()
         cursor.close()
         
@@ -346,18 +438,20 @@ def register():
     return render_template('register.html')
 
 @app.route('/books')
+@http_cache.conditional_page(current_catalog_version, catalog_readable)
 def books():
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     
     # Get category filter
     category_id = request.args.get('category', type=int)
     search_query = request.args.get('search', '')
+    after = decode_cursor(request.args.get('after'))
     
-    # Base query
+    # Base query, limited to the columns a catalog card renders
     query = '''
-        SELECT b.*, c.name as category_name 
+        SELECT b.id, b.title, b.authors, b.cover_image, b.price, b.category_id,
+               b.cover_thumb, b.cover_thumb_webp, b.description_snippet, b.created_at
         FROM books b 
-        LEFT JOIN book_categories c ON b.category_id = c.id
         WHERE 1=1
     '''
     params = []
@@ -369,27 +463,35 @@ def books():
     
     # Add search filter if specified
     if search_query:
-        query += ' AND (b.title LIKE %s OR b.authors LIKE %s OR b.description LIKE %s)'
-        search_pattern = f'%{search_query}%'
-        params.extend([search_pattern] * 3)
+        clause = search_clause(search_query)
+        query += f' AND {clause.where_sql}'
+        params.extend(clause.where_params)
     
-    query += ' ORDER BY b.created_at DESC'
+    # Continue after the last book of the previous page
+    if after:
+        keyset_sql, keyset_params = keyset_clause(after, 'b.created_at', 'b.id')
+        query += f' AND {keyset_sql}'
+        params.extend(keyset_params)
+    
+    query += ' ORDER BY b.created_at DESC, b.id DESC LIMIT %s'
+    params.append(BOOKS_PAGE_SIZE + 1)
     
     # Execute the query
     cursor.execute(query, tuple(params))
-    books = cursor.fetchall()
+    books, next_cursor = split_page(cursor.fetchall(), BOOKS_PAGE_SIZE)
+    cursor.close()
+    category_registry.attach_names(mysql.read_connection, books)
     
     # Get all categories for the filter
-    cursor.execute('SELECT * FROM book_categories ORDER BY name')
-    categories = cursor.fetchall()
-    
-    cursor.close()
+    categories = category_registry.all(mysql.read_connection)
     
     return render_template('books.html', 
                          books=books, 
                          categories=categories,
                          selected_category=category_id,
-                         search_query=search_query)
+                         search_query=search_query,
+                         next_cursor=next_cursor,
+                         is_first_page=after is None)
 
 @app.route('/search_books', methods=['GET', 'POST'])
 def search_books():
@@ -399,10 +501,8 @@ def search_books():
     if request.method == 'POST':
         query = request.form.get('query')
         results = search_google_books(query)
-        
-        if results and 'items' in results:
-            books = [get_book_details(item) for item in results['items']]
-            return render_template('search_results.html', books=books)
+        books = [get_book_details(item) for item in (results or {}).get('items', [])]
+        return render_template('search_books.html', query=query, books=books)
     
     return render_template('search_books.html')
 
@@ -523,13 +623,14 @@ def dashboard_route():
     if not session.get('loggedin'):
         return redirect(url_for('login'))
     
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     
     # Get borrowed books
     cursor.execute('''
         SELECT b.id, b.title, b.authors, b.cover_image, b.description, b.category_id,
-               bb.id as borrow_id, bb.borrow_date, bb.return_date, bb.days_borrowed, 
-               bb.total_cost, bb.returned, bb.actual_return_date
+               bb.id as borrow_id, bb.borrow_date, bb.due_date, bb.return_date,
+               DATEDIFF(COALESCE(bb.return_date, NOW()), bb.borrow_date) as days_borrowed,
+               bb.return_date IS NOT NULL as returned
         FROM borrowed_books bb
         JOIN books b ON bb.book_id = b.id
         WHERE bb.user_id = %s
@@ -575,12 +676,14 @@ def admin_add_book():
         flash('No cover image selected', 'warning')
         return redirect(url_for('admin_books'))
         
+    cover_name = None
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-        cover_path = url_for('static', filename=f'uploads/{filename}')
-    else:
-        cover_path = None
+        try:
+            cover_name = cover_pipeline.save_original(file)
+        except InvalidCover as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('admin_books'))
+    cover_path = cover_pipeline.url(cover_name) if cover_name else None
     
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
     cursor.execute('''INSERT INTO books (
@@ -595,9 +698,16 @@ def admin_add_book():
         )
     )
     book_id = cursor.lastrowid
+    stats.increment(cursor, stats.ADMIN_BOOKS)
+    version = catalog_version.bump(cursor)
     mysql.connection.commit()
+    catalog_version.advance(version)
     cursor.close()
     
+    # Thumbnails are built off the request and recorded on the row when ready
+    if cover_name:
+        cover_pipeline.schedule(book_id, cover_name)
+    
     # Log the activity
     log_admin_activity('ADD_BOOK', book_id, f"Added book: {request.form['title']}")
     
@@ -607,45 +717,55 @@ def admin_add_book():
 @app.route('/admin/books')
 @admin_required
 def admin_books():
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     cursor.execute('''
-        SELECT b.*, c.name as category_name, u.username as added_by_user
+        SELECT b.*, u.username as added_by_user
         FROM books b 
-        LEFT JOIN book_categories c ON b.category_id = c.id
         LEFT JOIN users u ON b.added_by = u.id
         WHERE b.source = 'admin'
         ORDER BY b.created_at DESC
     ''')
-    books = cursor.fetchall()
+    books = category_registry.attach_names(mysql.read_connection, cursor.fetchall())
+    cursor.close()
     
     # Get categories for the add book form
-    cursor.execute('SELECT * FROM book_categories ORDER BY name')
-    categories = cursor.fetchall()
-    
-    cursor.close()
+    categories = category_registry.all(mysql.read_connection)
     return render_template('admin/books.html', books=books, categories=categories)
 
 @app.route('/admin/books/edit/<int:book_id>', methods=['POST'])
 @admin_required
 def admin_edit_book(book_id):
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    
+    cover_name = None
     if 'cover_image' in request.files and request.files['cover_image'].filename != '':
         file = request.files['cover_image']
         if allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            cover_path = url_for('static', filename=f'uploads/{filename}')
-            cursor.execute('''UPDATE books SET title = %s, description = %s, cover_image = %s 
+            try:
+                cover_name = cover_pipeline.save_original(file)
+            except InvalidCover as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('admin_books'))
+    
+    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    if cover_name:
+        # The old variants belong to the old cover
+        cursor.execute('''UPDATE books SET title = %s, description = %s, cover_image = %s,
+                             cover_thumb = NULL, cover_thumb_webp = NULL,
+                             cover_medium = NULL, cover_medium_webp = NULL
                          WHERE id = %s''',
-                         (request.form['title'], request.form['description'], cover_path, book_id))
+                     (request.form['title'], request.form['description'],
+                      cover_pipeline.url(cover_name), book_id))
     else:
         cursor.execute('''UPDATE books SET title = %s, description = %s WHERE id = %s''',
                      (request.form['title'], request.form['description'], book_id))
     
+    version = catalog_version.bump(cursor)
     mysql.connection.commit()
+    catalog_version.advance(version)
     cursor.close()
     
+    if cover_name:
+        cover_pipeline.schedule(book_id, cover_name)
+    
     # Log the activity
     log_admin_activity('EDIT_BOOK', book_id, f"Edited book: {request.form['title']}")
     
@@ -656,8 +776,12 @@ def admin_edit_book(book_id):
 @admin_required
 def admin_delete_book(book_id):
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    stats.decrement_if_exists(cursor, stats.ADMIN_BOOKS,
+                              "SELECT 1 FROM books WHERE id = %s AND source = 'admin'", (book_id,))
     cursor.execute('DELETE FROM books WHERE id = %s', (book_id,))
+    version = catalog_version.bump(cursor)
     mysql.connection.commit()
+    catalog_version.advance(version)
     cursor.close()
     
     flash('Book deleted successfully', 'success')
@@ -690,6 +814,7 @@ def admin_add_user():
         INSERT INTO users (username, email, password, is_admin)
         VALUES (%s, %s, SHA2(%s, 256), %s)
     ''', (username, email, password, is_admin))
+    stats.increment(cursor, stats.TOTAL_USERS)
     mysql.connection.commit()
     cursor.close()
     
@@ -729,6 +854,8 @@ def admin_delete_user(user_id):
         return redirect(url_for('admin_users'))
     
     # Delete user
+    stats.decrement_if_exists(cursor, stats.TOTAL_USERS,
+                              'SELECT 1 FROM users WHERE id = %s', (user_id,))
     cursor.execute('DELETE FROM users WHERE id = %s', (user_id,))
     mysql.connection.commit()
     cursor.close()
@@ -804,7 +931,11 @@ def admin_book_categories():
             cursor.execute('INSERT INTO book_categories (name) VALUES (%s)',
                          (category_name,))
             category_id = cursor.lastrowid
+            categories_version = category_registry.invalidate(cursor)
+            version = catalog_version.bump(cursor)
             mysql.connection.commit()
+            category_registry.version.advance(categories_version)
+            catalog_version.advance(version)
             
             # Log the activity
             log_admin_activity('ADD_CATEGORY', category_id,
@@ -816,7 +947,11 @@ def admin_book_categories():
             category_id = request.form.get('category_id')
             cursor.execute('DELETE FROM book_categories WHERE id = %s',
                          (category_id,))
+            categories_version = category_registry.invalidate(cursor)
+            version = catalog_version.bump(cursor)
             mysql.connection.commit()
+            category_registry.version.advance(categories_version)
+            catalog_version.advance(version)
             
             # Log the activity
             log_admin_activity('DELETE_CATEGORY', category_id,
@@ -828,17 +963,14 @@ def admin_book_categories():
         return redirect(url_for('admin_book_categories'))
     
     # Get all categories
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cursor.execute('SELECT * FROM book_categories ORDER BY name')
-    categories = cursor.fetchall()
-    cursor.close()
+    categories = category_registry.all(mysql.connection)
     
     return render_template('admin/book_categories.html', categories=categories)
 
 @app.route('/admin/users')
 @admin_required
 def admin_users():
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     cursor.execute('SELECT * FROM users ORDER BY created_at DESC')
     users = cursor.fetchall()
     cursor.close()
@@ -849,17 +981,14 @@ def admin_users():
 def admin_dashboard():
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
     
-    # Get total books
-    cursor.execute('SELECT COUNT(*) as count FROM books WHERE source = "admin"')
-    total_books = cursor.fetchone()['count']
-    
-    # Get total users
-    cursor.execute('SELECT COUNT(*) as count FROM users')
-    total_users = cursor.fetchone()['count']
-    
-    # Get active users in last 24 hours
-    cursor.execute('SELECT COUNT(*) as count FROM users WHERE last_login > DATE_SUB(NOW(), INTERVAL 24 HOUR)')
-    active_users = cursor.fetchone()['count']
+    # Refresh the active-users snapshot if it is stale, then read every counter at once
+    stats.refresh_snapshots(cursor)
+    mysql.connection.commit()
+    counters = stats.read_stats(cursor)
+    total_books = counters.get(stats.ADMIN_BOOKS, {}).get('value', 0)
+    total_users = counters.get(stats.TOTAL_USERS, {}).get('value', 0)
+    active_users = counters.get(stats.ACTIVE_USERS_24H, {}).get('value', 0)
+    stats_updated = {name: row['updated_at'] for name, row in counters.items()}
     
     # Get recent users
     cursor.execute('SELECT * FROM users ORDER BY created_at DESC LIMIT 5')
@@ -875,13 +1004,29 @@ def admin_dashboard():
                          total_books=total_books,
                          total_users=total_users,
                          active_users=active_users,
+                         stats_updated=stats_updated,
                          recent_users=recent_users,
                          admin_logs=admin_logs)
 
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    print(f"Database pool exhausted: {e}")
+    return 'The service is busy, please try again shortly.', 503, {'Retry-After': '5'}
+
+@app.route('/admin/pool-stats')
+@admin_required
+def admin_pool_stats():
+    return jsonify(mysql.stats())
+
+@app.route('/admin/cache-stats')
+@admin_required
+def admin_cache_stats():
+    return jsonify({'external': external_cache.stats(), 'covers': cover_proxy.stats()})
+
 @app.route('/admin/users/<int:user_id>')
 @admin_required
 def get_user(user_id):
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     cursor.execute('SELECT * FROM users WHERE id = %s', (user_id,))
     user = cursor.fetchone()
     cursor.close()
@@ -899,7 +1044,7 @@ def my_books():
     if not session.get('loggedin'):
         return redirect(url_for('login'))
     
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     
     try:
         # Get borrowed books
@@ -954,7 +1099,7 @@ def my_books():
 @app.route('/admin/borrowed-books')
 @admin_required
 def admin_borrowed_books():
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     
     cursor.execute('''
         SELECT bb.*, b.title as book_title, b.authors, b.cover_image,
@@ -972,7 +1117,7 @@ def admin_borrowed_books():
 @app.route('/admin/purchased-books')
 @admin_required
 def admin_purchased_books():
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     
     cursor.execute('''
         SELECT pb.*, b.title as book_title, b.authors, b.cover_image,
@@ -987,6 +1132,35 @@ def admin_purchased_books():
     cursor.close()
     return render_template('admin/purchased_books.html', purchased_books=purchased_books)
 
+@app.route('/admin/export/<table>')
+@admin_required
+def admin_export(table):
+    fmt = request.args.get('format', 'csv')
+    if table not in EXPORTS or fmt not in FORMATS:
+        flash('Unknown export.', 'danger')
+        return redirect(url_for('admin_dashboard'))
+    
+    compress = request.args.get('gzip') == '1'
+    query, params = export_query(table, date_arg('start'), date_arg('end'))
+    
+    @stream_with_context
+    def generate():
+        # Server-side cursor: rows are pulled from MySQL as the response is sent
+        cursor = mysql.read_connection.cursor(MySQLdb.cursors.SSDictCursor)
+        try:
+            cursor.execute(query, params)
+            yield from stream_export(cursor, table, fmt, compress)
+        finally:
+            cursor.close()
+    
+    filename = f"{table}-{datetime.now():%Y%m%d%H%M%S}.{fmt}"
+    mimetype = FORMATS[fmt]
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(generate(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 @app.route('/return-book/<int:borrow_id>', methods=['POST'])
 def return_book(borrow_id):
     if not session.get('loggedin'):
@@ -1065,34 +1239,14 @@ def add_to_cart(book_id):
         return redirect(url_for('login'))
     
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    summary = cart_service.add_item(mysql.connection, cursor, session['id'], book_id)
+    cursor.close()
     
-    # Check if book exists
-    cursor.execute('SELECT * FROM books WHERE id = %s', (book_id,))
-    book = cursor.fetchone()
-    if not book:
+    if summary is None:
         flash('Book not found!', 'danger')
         return redirect(url_for('books'))
     
-    # Check if book is already in cart
-    cursor.execute('SELECT * FROM cart_items WHERE user_id = %s AND book_id = %s',
-                  (session['id'], book_id))
-    cart_item = cursor.fetchone()
-    
-    if cart_item:
-        # Update quantity
-        cursor.execute('''
-            UPDATE cart_items 
-            SET quantity = quantity + 1 
-            WHERE user_id = %s AND book_id = %s
-        ''', (session['id'], book_id))
-    else:
-        # Add new item to cart
-        cursor.execute('''
-            INSERT INTO cart_items (user_id, book_id, quantity)
-            VALUES (%s, %s, 1)
-        ''', (session['id'], book_id))
-    
-    mysql.connection.commit()
+    remember_cart(summary)
     flash('Book added to cart!', 'success')
     return redirect(url_for('cart'))
 
@@ -1103,20 +1257,12 @@ def cart():
     
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
     
-    # Get cart items with book details
-    cursor.execute('''
-        SELECT ci.*, b.title, b.authors, b.cover_image, b.price
-        FROM cart_items ci
-        JOIN books b ON ci.book_id = b.id
-        WHERE ci.user_id = %s
-    ''', (session['id'],))
-    cart_items = cursor.fetchall()
-    
-    # Calculate total
-    subtotal = sum(item['price'] * item['quantity'] for item in cart_items)
+    # Get cart items with book details and the cart total
+    cart_items, summary = cart_service.get_cart(cursor, session['id'])
+    remember_cart(summary)
     
     cursor.close()
-    return render_template('cart.html', cart_items=cart_items, subtotal=subtotal)
+    return render_template('cart.html', cart_items=cart_items, subtotal=summary['subtotal'])
 
 @app.route('/remove_from_cart/<int:item_id>', methods=['POST'])
 def remove_from_cart(item_id):
@@ -1124,9 +1270,7 @@ def remove_from_cart(item_id):
         return redirect(url_for('login'))
     
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cursor.execute('DELETE FROM cart_items WHERE id = %s AND user_id = %s',
-                  (item_id, session['id']))
-    mysql.connection.commit()
+    remember_cart(cart_service.remove_item(mysql.connection, cursor, session['id'], item_id))
     cursor.close()
     
     flash('Item removed from cart!', 'success')
@@ -1138,16 +1282,9 @@ def update_cart(item_id):
         return redirect(url_for('login'))
     
     quantity = int(request.form.get('quantity', 1))
-    if quantity < 1:
-        quantity = 1
     
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cursor.execute('''
-        UPDATE cart_items 
-        SET quantity = %s 
-        WHERE id = %s AND user_id = %s
-    ''', (quantity, item_id, session['id']))
-    mysql.connection.commit()
+    remember_cart(cart_service.set_quantity(mysql.connection, cursor, session['id'], item_id, quantity))
     cursor.close()
     
     return redirect(url_for('cart'))
@@ -1159,23 +1296,15 @@ def checkout():
     
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
     
-    # Get cart items
-    cursor.execute('''
-        SELECT ci.*, b.title, b.authors, b.price
-        FROM cart_items ci
-        JOIN books b ON ci.book_id = b.id
-        WHERE ci.user_id = %s
-    ''', (session['id'],))
-    cart_items = cursor.fetchall()
+    # Get cart items and totals
+    cart_items, summary = cart_service.get_cart(cursor, session['id'])
+    cursor.close()
     
     if not cart_items:
         return redirect(url_for('cart'))
     
-    # Calculate totals
-    subtotal = sum(item['price'] * item['quantity'] for item in cart_items)
+    subtotal = summary['subtotal']
     total = subtotal  # Add tax or shipping if needed
-    
-    cursor.close()
     return render_template('checkout.html',
                          cart_items=cart_items,
                          subtotal=subtotal,
@@ -1194,22 +1323,6 @@ def process_payment():
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
     
     try:
-        # Get cart items
-        cursor.execute('''
-            SELECT ci.*, b.price, b.id as book_id, b.title
-            FROM cart_items ci
-            JOIN books b ON b.id = ci.book_id
-            WHERE ci.user_id = %s
-        ''', (session['id'],))
-        cart_items = cursor.fetchall()
-        
-        if not cart_items:
-            flash('Your cart is empty!', 'warning')
-            return redirect(url_for('cart'))
-        
-        # Calculate total
-        total_amount = sum(item['price'] * item['quantity'] for item in cart_items)
-        
         # Process payment
         if payment_method == 'card':
             card_number = request.form.get('card_number')
@@ -1231,30 +1344,18 @@ def process_payment():
                 flash('Please enter your phone number!', 'danger')
                 return redirect(url_for('checkout'))
             payment_details = phone
-            
-        # Create order
-        cursor.execute('''
-            INSERT INTO orders (user_id, total_amount, payment_method, payment_details)
-            VALUES (%s, %s, %s, %s)
-        ''', (session['id'], total_amount, payment_method, payment_details))
-        order_id = cursor.lastrowid
         
-        # Add order items
-        for item in cart_items:
-            cursor.execute('''
-                INSERT INTO order_items (order_id, book_id, quantity, price)
-                VALUES (%s, %s, %s, %s)
-            ''', (order_id, item['book_id'], item['quantity'], item['price']))
+        # Lock the cart so a double submit waits here and then finds it empty
+        cart_items = cart_service.lock_items(cursor, session['id'])
+        if not cart_items:
+            mysql.connection.rollback()
+            flash('Your cart is empty!', 'warning')
+            return redirect(url_for('cart'))
             
-            # Add to purchased books
-            cursor.execute('''
-                INSERT INTO purchased_books (user_id, book_id, purchase_date, price)
-                VALUES (%s, %s, NOW(), %s)
-            ''', (session['id'], item['book_id'], item['price']))
-        
-        # Clear cart
-        cursor.execute('DELETE FROM cart_items WHERE user_id = %s', (session['id'],))
-        mysql.connection.commit()
+        # Create the order, its items and purchases, and clear the cart in one transaction
+        place_purchase(mysql.connection, cursor, session['id'], cart_items,
+                       payment_method, payment_details, clear_cart=True)
+        remember_cart({'count': 0, 'subtotal': 0})
         
         # Success message
         if payment_method == 'card':
@@ -1396,27 +1497,12 @@ def process_direct_payment():
             return redirect(url_for('direct_payment'))
 
         if direct_purchase:
-            # Create order for purchase
-            cursor.execute('''
-                INSERT INTO orders (user_id, total_amount, payment_method, payment_details, order_type)
-                VALUES (%s, %s, %s, %s, 'purchase')
-            ''', (session['id'], direct_purchase['price'], payment_method, payment_details))
-            mysql.connection.commit()
-            order_id = cursor.lastrowid
-            
-            # Add order item
-            cursor.execute('''
-                INSERT INTO order_items (order_id, book_id, quantity, price)
-                VALUES (%s, %s, %s, %s)
-            ''', (order_id, direct_purchase['book_id'], 1, direct_purchase['price']))
-            mysql.connection.commit()
-            
-            # Add to purchased books
-            cursor.execute('''
-                INSERT INTO purchased_books (user_id, book_id, price)
-                VALUES (%s, %s, %s)
-            ''', (session['id'], direct_purchase['book_id'], direct_purchase['price']))
-            mysql.connection.commit()
+            # Create the order, its item and the purchase in one transaction
+            place_purchase(mysql.connection, cursor, session['id'], [{
+                'book_id': direct_purchase['book_id'],
+                'quantity': 1,
+                'price': direct_purchase['price']
+            }], payment_method, payment_details)
             
             flash('Payment successful! Your book has been added to your library.', 'success')
             
@@ -1424,20 +1510,9 @@ def process_direct_payment():
             # Get selected days
             days = int(request.form.get('days', 14))
             
-            # Create order for borrowing fee
-            cursor.execute('''
-                INSERT INTO orders (user_id, total_amount, payment_method, payment_details, order_type)
-                VALUES (%s, %s, %s, %s, 'borrow')
-            ''', (session['id'], 2.00, payment_method, payment_details))
-            mysql.connection.commit()
-            order_id = cursor.lastrowid
-            
-            # Add to borrowed books
-            cursor.execute('''
-                INSERT INTO borrowed_books (user_id, book_id, borrow_date, due_date, order_id)
-                VALUES (%s, %s, NOW(), DATE_ADD(NOW(), INTERVAL %s DAY), %s)
-            ''', (session['id'], direct_borrow['book_id'], days, order_id))
-            mysql.connection.commit()
+            # Create the borrowing-fee order and the borrow record in one transaction
+            place_borrow(mysql.connection, cursor, session['id'], direct_borrow['book_id'],
+                         days, payment_method, payment_details)
             
             flash(f'Payment successful! Book borrowed. Please return it within {days} days.', 'success')
         
@@ -1463,32 +1538,84 @@ def admin_transactions():
     if not session.get('is_admin'):
         return redirect(url_for('login'))
     
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    # Filters
+    start_date = date_arg('start')
+    end_date = date_arg('end')
+    username = request.args.get('user', '').strip()
+    order_type = request.args.get('order_type', '')
+    after = decode_cursor(request.args.get('after'))
+    
+    cursor = mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
     try:
-        # Get all transactions with user and book details
-        cursor.execute('''
-            SELECT 
-                o.*,
-                u.username,
-                CASE 
-                    WHEN o.order_type = 'purchase' THEN
-                        (SELECT b.title 
-                         FROM order_items oi 
-                         JOIN books b ON b.id = oi.book_id 
-                         WHERE oi.order_id = o.id 
-                         LIMIT 1)
-                    ELSE
-                        (SELECT b.title 
-                         FROM borrowed_books bb 
-                         JOIN books b ON b.id = bb.book_id 
-                         WHERE bb.order_id = o.id)
-                END as book_title
+        # Get one page of orders with user details
+        query = '''
+            SELECT o.*, u.username
             FROM orders o
             JOIN users u ON u.id = o.user_id
-            ORDER BY o.order_date DESC
-        ''')
-        transactions = cursor.fetchall()
-        return render_template('admin/transactions.html', transactions=transactions)
+            WHERE 1=1
+        '''
+        params = []
+        
+        if start_date:
+            query += ' AND o.order_date >= %s'
+            params.append(start_date)
+        if end_date:
+            query += ' AND o.order_date < DATE_ADD(%s, INTERVAL 1 DAY)'
+            params.append(end_date)
+        if username:
+            query += ' AND u.username = %s'
+            params.append(username)
+        if order_type in ('purchase', 'borrow'):
+            query += ' AND o.order_type = %s'
+            params.append(order_type)
+        if after:
+            keyset_sql, keyset_params = keyset_clause(after, 'o.order_date', 'o.id')
+            query += f' AND {keyset_sql}'
+            params.extend(keyset_params)
+        
+        query += ' ORDER BY o.order_date DESC, o.id DESC LIMIT %s'
+        params.append(TRANSACTIONS_PAGE_SIZE + 1)
+        cursor.execute(query, tuple(params))
+        transactions, next_cursor = split_page(cursor.fetchall(), TRANSACTIONS_PAGE_SIZE,
+                                               time_key='order_date')
+        
+        # Look up the book titles for the whole page at once
+        order_ids = [transaction['id'] for transaction in transactions]
+        purchase_titles, borrow_titles = {}, {}
+        if order_ids:
+            placeholders = ', '.join(['%s'] * len(order_ids))
+            cursor.execute(f'''
+                SELECT oi.order_id, MIN(b.title) as title
+                FROM order_items oi
+                JOIN books b ON b.id = oi.book_id
+                WHERE oi.order_id IN ({placeholders})
+                GROUP BY oi.order_id
+            ''', tuple(order_ids))
+            purchase_titles = {row['order_id']: row['title'] for row in cursor.fetchall()}
+            
+            cursor.execute(f'''
+                SELECT bb.order_id, MIN(b.title) as title
+                FROM borrowed_books bb
+                JOIN books b ON b.id = bb.book_id
+                WHERE bb.order_id IN ({placeholders})
+                GROUP BY bb.order_id
+            ''', tuple(order_ids))
+            borrow_titles = {row['order_id']: row['title'] for row in cursor.fetchall()}
+        
+        for transaction in transactions:
+            titles = purchase_titles if transaction['order_type'] == 'purchase' else borrow_titles
+            transaction['book_title'] = titles.get(transaction['id'])
+        
+        return render_template('admin/transactions.html',
+                             transactions=transactions,
+                             next_cursor=next_cursor,
+                             is_first_page=after is None,
+                             filters={
+                                 'start': start_date.isoformat() if start_date else '',
+                                 'end': end_date.isoformat() if end_date else '',
+                                 'user': username,
+                                 'order_type': order_type
+                             })
     except Exception as e:
         print(str(e))  # For debugging
         flash('An error occurred while fetching transactions.', 'danger')
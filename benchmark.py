@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import MySQLdb
+import mysql.connector
+from dotenv import load_dotenv
+
+import generate_data
+
+# Load environment variables
+load_dotenv()
+
+# Dataset presets: books, users and orders to seed
+SIZES = {
+    '10k': {'books': 10_000, 'users': 1_000, 'orders': 5_000},
+    '100k': {'books': 100_000, 'users': 10_000, 'orders': 50_000},
+    '1m': {'books': 1_000_000, 'users': 100_000, 'orders': 500_000},
+}
+
+ROUTES = ['/', '/books', '/search', '/book/<id>', '/add_to_cart', '/checkout',
+          '/process_payment', '/my-books']
+
+# Successful write routes redirect to a known page; anything else is an error.
+# A redirect elsewhere (the login page, or home after a failed search) means the
+# route did not do its work.
+EXPECTED_REDIRECTS = {
+    '/add_to_cart': '/cart',
+    '/process_payment': '/my-books',
+}
+
+
+def connect(database=None):
+    return MySQLdb.connect(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        user=os.getenv('MYSQL_USER', 'root'),
+        passwd=os.getenv('MYSQL_PASSWORD', ''),
+        db=database or '',
+        charset='utf8mb4',
+    )
+
+
+def create_database(database):
+    """Recreate `database` from schema.sql"""
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE `{database}`")
+    cursor.execute(f"USE `{database}`")
+    with open('schema.sql', 'r') as file:
+        for command in file.read().split(';'):
+            command = command.strip()
+            if not command or command.upper().startswith(('CREATE DATABASE', 'USE ')):
+                continue
+            cursor.execute(command)
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def seed_database(database, size, method):
+    """Fill a freshly created benchmark database with the generator's deterministic data"""
+    connection = mysql.connector.connect(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        user=os.getenv('MYSQL_USER', 'root'),
+        password=os.getenv('MYSQL_PASSWORD', ''),
+        database=database,
+        allow_local_infile=True
+    )
+    try:
+        generate_data.generate(connection, seed=42, method=method, **size)
+    finally:
+        connection.close()
+
+
+def _outcome(response):
+    # (status code, path of the redirect target or None)
+    location = response.headers.get('Location')
+    return response.status_code, urlsplit(location).path if location else None
+
+
+class InProcessClient:
+    """Drives the Flask app through its test client, one cookie jar per worker"""
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+
+    def get(self, path):
+        return _outcome(self.client.get(path))
+
+    def post(self, path, data=None):
+        return _outcome(self.client.post(path, data=data))
+
+    def has_session(self):
+        return self.client.get_cookie(self.app.config['SESSION_COOKIE_NAME']) is not None
+
+
+class HttpClient:
+    """Drives a running server over HTTP, one keep-alive session per worker"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def get(self, path):
+        return _outcome(self.session.get(self.base_url + path, allow_redirects=False))
+
+    def post(self, path, data=None):
+        return _outcome(self.session.post(self.base_url + path, data=data, allow_redirects=False))
+
+    def has_session(self):
+        return 'session' in self.session.cookies
+
+
+class Workload:
+    """Picks request targets for each route from the seeded id ranges"""
+
+    def __init__(self, database, seed=7):
+        connection = connect(database)
+        cursor = connection.cursor()
+        cursor.execute('SELECT MIN(id), MAX(id) FROM books')
+        self.first_book, self.last_book = cursor.fetchone()
+        cursor.execute("SELECT username FROM users WHERE username LIKE 'synthetic\\_%' ORDER BY id LIMIT 1000")
+        self.usernames = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        connection.close()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def book_id(self):
+        with self.lock:
+            return self.rng.randint(self.first_book, self.last_book)
+
+    def search_term(self):
+        with self.lock:
+            return self.rng.choice(generate_data.VOCABULARY)
+
+
+def run_route(route, client, workload):
+    """Issue one request for `route` and return (status code, redirect path)"""
+    if route == '/':
+        return client.get('/')
+    if route == '/books':
+        return client.get('/books')
+    if route == '/search':
+        return client.get(f'/search?q={workload.search_term()}')
+    if route == '/book/<id>':
+        return client.get(f'/book/{workload.book_id()}')
+    if route == '/add_to_cart':
+        return client.post(f'/add_to_cart/{workload.book_id()}')
+    if route == '/checkout':
+        return client.get('/checkout')
+    if route == '/process_payment':
+        return client.post('/process_payment', {'payment_method': 'card',
+                                                 'card_number': '4111111111111111'})
+    if route == '/my-books':
+        return client.get('/my-books')
+    raise ValueError(f"Unknown route: {route}")
+
+
+def prepare_route(route, client, workload):
+    # Untimed setup so the measured request does real work
+    if route in ('/checkout', '/process_payment'):
+        client.post(f'/add_to_cart/{workload.book_id()}')
+
+
+def succeeded(route, status, location):
+    if status in (301, 302, 303, 307, 308):
+        return location == EXPECTED_REDIRECTS.get(route)
+    return status == 200 and route not in EXPECTED_REDIRECTS
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, int(round(pct / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def benchmark_route(route, clients, workload, requests_per_route):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    per_worker = max(1, requests_per_route // len(clients))
+
+    def worker(client):
+        nonlocal errors
+        for _ in range(per_worker):
+            prepare_route(route, client, workload)
+            started = time.perf_counter()
+            try:
+                status, location = run_route(route, client, workload)
+            except Exception as e:
+                print(f"Request error on {route}: {e}")
+                status, location = 599, None
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not succeeded(route, status, location):
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        list(executor.map(worker, clients))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
+
+
+def make_clients(args, workload):
+    if args.base_url:
+        factory = lambda: HttpClient(args.base_url)
+    else:
+        # The app reads MYSQL_DB at import time, so point it at the benchmark database first
+        os.environ['MYSQL_DB'] = args.database
+        os.environ.setdefault('EXTERNAL_SEARCH_DEADLINE', '0.5')
+        from app import app
+        factory = lambda: InProcessClient(app)
+
+    clients = []
+    for i in range(args.concurrency):
+        client = factory()
+        username = workload.usernames[i % len(workload.usernames)]
+        status, location = client.post('/login', {'username': username,
+                                                  'password': generate_data.DEFAULT_PASSWORD})
+        # Logged-in users land on the home dashboard; anything else would benchmark the login page
+        if status != 302 or location != '/' or not client.has_session():
+            raise SystemExit(f"Could not log in as {username}: got {status} to {location or 'no redirect'}")
+        clients.append(client)
+    return clients
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as file:
+        baseline = json.load(file)
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('commit')}):")
+    for route, current in results['routes'].items():
+        previous = baseline['routes'].get(route)
+        if not previous or not previous.get('p95_ms') or not current.get('p95_ms'):
+            continue
+        change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+        print(f"  {route:18} p95 {previous['p95_ms']:>9.2f}ms -> {current['p95_ms']:>9.2f}ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a benchmark database and measure the hot routes")
+    parser.add_argument('--size', choices=SIZES, default='10k', help="dataset preset")
+    parser.add_argument('--database', default='elibrary_bench', help="database to (re)create and use")
+    parser.add_argument('--method', choices=('infile', 'insert'), default='infile',
+                        help="how the generator loads the seed data")
+    parser.add_argument('--skip-seed', action='store_true', help="reuse an already seeded database")
+    parser.add_argument('--concurrency', type=int, default=8, help="concurrent clients")
+    parser.add_argument('--requests', type=int, default=400, help="requests per route")
+    parser.add_argument('--routes', nargs='+', choices=ROUTES, default=ROUTES)
+    parser.add_argument('--base-url', help="benchmark a running server instead of the app in-process")
+    parser.add_argument('--output', default='bench_results.json', help="where to write results")
+    parser.add_argument('--compare', help="previous results file to compare p95 latencies with")
+    args = parser.parse_args()
+
+    size = SIZES[args.size]
+    if not args.skip_seed:
+        started = time.perf_counter()
+        create_database(args.database)
+        seed_database(args.database, size, args.method)
+        print(f"Seeded {args.database} with {size} in {time.perf_counter() - started:.1f}s")
+
+    workload = Workload(args.database)
+    clients = make_clients(args, workload)
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'size': args.size,
+            'dataset': size,
+            'concurrency': args.concurrency,
+            'requests_per_route': args.requests,
+            'target': args.base_url or 'in-process',
+        },
+        'routes': {},
+    }
+    for route in args.routes:
+        results['routes'][route] = route_stats = benchmark_route(route, clients, workload, args.requests)
+        print(f"{route:18} {route_stats['throughput_rps']:>8} req/s  p50 {route_stats['p50_ms']}ms  "
+              f"p95 {route_stats['p95_ms']}ms  p99 {route_stats['p99_ms']}ms  errors {route_stats['errors']}")
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
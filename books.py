@@ -2,6 +2,7 @@ import os
 import requests
 from datetime import datetime, timedelta
 from flask import current_app
+from response_cache import fetch_json
 
 def search_google_books(query, max_results=10):
     """Search books using Google Books API"""
@@ -15,9 +16,7 @@ def search_google_books(query, max_results=10):
     }
     
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        return response.json()
+        return fetch_json('google', base_url, params=params, timeout=10)
     except requests.RequestException as e:
         print(f"Error fetching books: {e}")
         return None
@@ -0,0 +1,80 @@
+def get_summary(cursor, user_id):
+    """Return the cart's item count and subtotal"""
+    cursor.execute('''
+        SELECT COALESCE(SUM(ci.quantity), 0) as count,
+               COALESCE(SUM(b.price * ci.quantity), 0) as subtotal
+        FROM cart_items ci
+        JOIN books b ON b.id = ci.book_id
+        WHERE ci.user_id = %s
+    ''', (user_id,))
+    row = cursor.fetchone()
+    return {'count': int(row['count']), 'subtotal': row['subtotal']}
+
+
+def add_item(connection, cursor, user_id, book_id):
+    """Add one copy of a book to the cart and return the new cart summary
+
+    Relies on the unique (user_id, book_id) key so concurrent clicks bump the
+    quantity of a single row. Returns None if the book does not exist.
+    """
+    cursor.execute('''
+        INSERT INTO cart_items (user_id, book_id, quantity)
+        SELECT %s, b.id, 1 FROM books b WHERE b.id = %s
+        ON DUPLICATE KEY UPDATE cart_items.quantity = cart_items.quantity + 1
+    ''', (user_id, book_id))
+    if cursor.rowcount == 0:
+        connection.rollback()
+        return None
+    connection.commit()
+    return get_summary(cursor, user_id)
+
+
+def set_quantity(connection, cursor, user_id, item_id, quantity):
+    """Set an item's quantity (at least 1) and return the new cart summary"""
+    cursor.execute('''
+        UPDATE cart_items
+        SET quantity = %s
+        WHERE id = %s AND user_id = %s
+    ''', (max(1, quantity), item_id, user_id))
+    connection.commit()
+    return get_summary(cursor, user_id)
+
+
+def remove_item(connection, cursor, user_id, item_id):
+    """Remove an item from the cart and return the new cart summary"""
+    cursor.execute('DELETE FROM cart_items WHERE id = %s AND user_id = %s',
+                   (item_id, user_id))
+    connection.commit()
+    return get_summary(cursor, user_id)
+
+
+def get_cart(cursor, user_id):
+    """Return the cart's items with book details and their summary from one query"""
+    cursor.execute('''
+        SELECT ci.*, b.title, b.authors, b.cover_image, b.price
+        FROM cart_items ci
+        JOIN books b ON ci.book_id = b.id
+        WHERE ci.user_id = %s
+    ''', (user_id,))
+    items = cursor.fetchall()
+    summary = {
+        'count': sum(item['quantity'] for item in items),
+        'subtotal': sum(item['price'] * item['quantity'] for item in items),
+    }
+    return items, summary
+
+
+def lock_items(cursor, user_id):
+    """Return the cart's items with their prices, locking the cart rows until the transaction ends
+
+    A second checkout of the same cart waits on the lock, then finds the
+    ordered rows already gone instead of placing the order twice.
+    """
+    cursor.execute('''
+        SELECT ci.*, b.price, b.id as book_id, b.title
+        FROM cart_items ci
+        JOIN books b ON b.id = ci.book_id
+        WHERE ci.user_id = %s
+        FOR UPDATE OF ci
+    ''', (user_id,))
+    return cursor.fetchall()
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used entry past `max_entries`"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class VersionCounter:
+    """Named version number shared by all workers through the cache_versions table
+
+    Workers re-read the row at most once per `check_interval` seconds, so a
+    bump made by another worker is picked up within that interval. A bump
+    made by this worker takes effect here as soon as the caller passes the
+    committed value to `advance`.
+    """
+
+    def __init__(self, name, check_interval=5.0):
+        self.name = name
+        self.check_interval = check_interval
+        self.version = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self, connection):
+        with self._lock:
+            if self.version is not None and time.monotonic() - self.checked_at < self.check_interval:
+                return self.version
+        version = self.stored(connection)
+        with self._lock:
+            self.version = version
+            self.checked_at = time.monotonic()
+            return self.version
+
+    def stored(self, connection):
+        """The version as `connection` sees it, bypassing the local copy
+
+        Compare against `current()` to tell whether a replica has applied the
+        latest bump yet.
+        """
+        cursor = connection.cursor()
+        cursor.execute('SELECT version FROM cache_versions WHERE name = %s', (self.name,))
+        row = cursor.fetchone()
+        cursor.close()
+        return _first_value(row) if row else 0
+
+    def bump(self, cursor):
+        """Increment the version inside the caller's transaction and return the new value
+
+        The local version is left alone until the transaction commits, so a
+        concurrent render never caches uncommitted rows under the new version
+        and a rollback leaves nothing behind.
+        """
+        cursor.execute('''
+            INSERT INTO cache_versions (name, version) VALUES (%s, LAST_INSERT_ID(1))
+            ON DUPLICATE KEY UPDATE version = LAST_INSERT_ID(version + 1)
+        ''', (self.name,))
+        return cursor.lastrowid
+
+    def advance(self, version):
+        """Use a version returned by `bump` once its transaction has committed"""
+        with self._lock:
+            if self.version is None or version > self.version:
+                self.version = version
+                self.checked_at = time.monotonic()
+
+
+def _first_value(row):
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+VERSION_CHECK_INTERVAL = float(os.getenv('CACHE_VERSION_CHECK_INTERVAL', 5))
+
+catalog_version = VersionCounter('catalog', VERSION_CHECK_INTERVAL)
+fragment_cache = LRUCache(max_entries=int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 32)))
+
+
+def cached_fragment(name, version, render, cacheable=None):
+    """Return the rendered fragment `name` for `version`, calling `render()` on a miss
+
+    A fresh render is only stored when `cacheable()` is true, so callers can
+    refuse to cache rows read from a replica that is still behind `version`.
+    """
+    key = (name, version)
+    html = fragment_cache.get(key)
+    if html is None:
+        html = render()
+        if cacheable is None or cacheable():
+            fragment_cache.set(key, html)
+    return html
+
+
+class CategoryRegistry:
+    """Per-worker copy of book_categories, reloaded whenever its version row changes"""
+
+    def __init__(self, version):
+        self.version = version
+        self.loaded_version = None
+        self.categories = []
+        self.by_id = {}
+        self._lock = threading.Lock()
+
+    def _load(self, connection):
+        version = self.version.current(connection)
+        with self._lock:
+            if version == self.loaded_version:
+                return self.categories, self.by_id
+        cursor = connection.cursor()
+        cursor.execute('SELECT id, name, description, created_at FROM book_categories ORDER BY name')
+        columns = [column[0] for column in cursor.description]
+        categories = [row if isinstance(row, dict) else dict(zip(columns, row))
+                      for row in cursor.fetchall()]
+        cursor.close()
+        # A lagging replica may return rows older than `version`; label them with
+        # what it has applied so the next call reloads once it catches up
+        loaded_version = min(version, self.version.stored(connection))
+        by_id = {category['id']: category['name'] for category in categories}
+        with self._lock:
+            self.categories, self.by_id, self.loaded_version = categories, by_id, loaded_version
+        return categories, by_id
+
+    def all(self, connection):
+        """Categories ordered by name"""
+        return self._load(connection)[0]
+
+    def names(self, connection):
+        """Map of category id to name"""
+        return self._load(connection)[1]
+
+    def attach_names(self, connection, rows, key='category_id', target='category_name'):
+        """Fill in category names on book rows instead of joining book_categories"""
+        names = self.names(connection)
+        for row in rows:
+            row[target] = names.get(row.get(key))
+        return rows
+
+    def invalidate(self, cursor):
+        """Bump the categories version inside the caller's transaction and return it for `advance`"""
+        return self.version.bump(cursor)
+
+
+category_registry = CategoryRegistry(VersionCounter('categories', VERSION_CHECK_INTERVAL))
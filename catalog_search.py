@@ -0,0 +1,60 @@
+import re
+
+# Relevance weights applied to the per-column FULLTEXT scores
+TITLE_BOOST = 3.0
+AUTHORS_BOOST = 2.0
+BODY_BOOST = 1.0
+
+# Matches InnoDB's default innodb_ft_min_token_size
+MIN_TOKEN_LENGTH = 3
+MAX_TERMS = 8
+
+# InnoDB's default FULLTEXT stopword list; a required stopword would match nothing
+STOPWORDS = frozenset('''
+    a about an are as at be by com de en for from how i in is it la of on or
+    that the this to was what when where who will with und www
+'''.split())
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchClause:
+    """SQL fragments for filtering and ranking books by a search string"""
+
+    def __init__(self, where_sql, where_params, score_sql, score_params):
+        self.where_sql = where_sql
+        self.where_params = where_params
+        self.score_sql = score_sql
+        self.score_params = score_params
+
+
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def boolean_query(text):
+    """Turn free text into a BOOLEAN MODE query requiring every term as a prefix"""
+    terms = [t for t in _TOKEN_RE.findall(text.lower())
+             if len(t) >= MIN_TOKEN_LENGTH and t not in STOPWORDS]
+    return ' '.join(f'+{term}*' for term in terms[:MAX_TERMS])
+
+
+def search_clause(text, alias='b'):
+    """Build a FULLTEXT filter and boosted relevance score for `text`
+
+    Queries made only of very short terms (which the FULLTEXT index does not
+    store) fall back to an index-friendly title prefix match.
+    """
+    query = boolean_query(text)
+    if not query:
+        prefix = escape_like(text.strip())
+        return SearchClause(f'{alias}.title LIKE %s', [f'{prefix}%'], '0', [])
+
+    where_sql = (f'MATCH({alias}.title, {alias}.authors, {alias}.description) '
+                 f'AGAINST (%s IN BOOLEAN MODE)')
+    score_sql = (
+        f'({TITLE_BOOST} * MATCH({alias}.title) AGAINST (%s IN BOOLEAN MODE)'
+        f' + {AUTHORS_BOOST} * MATCH({alias}.authors) AGAINST (%s IN BOOLEAN MODE)'
+        f' + {BODY_BOOST} * {where_sql})'
+    )
+    return SearchClause(where_sql, [query], score_sql, [query, query, query])
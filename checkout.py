@@ -0,0 +1,77 @@
+BORROW_FEE = 2.00
+
+
+def _rows_sql(count, width):
+    return ', '.join(['(' + ', '.join(['%s'] * width) + ')'] * count)
+
+
+def place_purchase(connection, cursor, user_id, items, payment_method, payment_details,
+                   clear_cart=False):
+    """Write a purchase order in a single transaction and return its id
+
+    `items` are dicts with book_id, quantity and price. Order items and
+    purchased books are written with one multi-row INSERT each, so the number
+    of statements does not grow with the cart, and nothing is visible until
+    the single commit. With `clear_cart`, only the ordered books are removed
+    from the cart; read them with cart.lock_items in the same transaction.
+    """
+    if not items:
+        raise ValueError("Cannot place an order without items")
+    total_amount = sum(item['price'] * item['quantity'] for item in items)
+
+    try:
+        cursor.execute('''
+            INSERT INTO orders (user_id, total_amount, payment_method, payment_details, order_type)
+            VALUES (%s, %s, %s, %s, 'purchase')
+        ''', (user_id, total_amount, payment_method, payment_details))
+        order_id = cursor.lastrowid
+
+        order_values = []
+        purchase_values = []
+        for item in items:
+            order_values.extend((order_id, item['book_id'], item['quantity'], item['price']))
+            purchase_values.extend((user_id, item['book_id'], item['price']))
+
+        cursor.execute(f'''
+            INSERT INTO order_items (order_id, book_id, quantity, price)
+            VALUES {_rows_sql(len(items), 4)}
+        ''', order_values)
+        cursor.execute(f'''
+            INSERT INTO purchased_books (user_id, book_id, price)
+            VALUES {_rows_sql(len(items), 3)}
+        ''', purchase_values)
+
+        if clear_cart:
+            book_ids = [item['book_id'] for item in items]
+            cursor.execute(f'''
+                DELETE FROM cart_items
+                WHERE user_id = %s AND book_id IN ({', '.join(['%s'] * len(book_ids))})
+            ''', [user_id] + book_ids)
+
+        connection.commit()
+        return order_id
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def place_borrow(connection, cursor, user_id, book_id, days, payment_method, payment_details,
+                 fee=BORROW_FEE):
+    """Write a borrow order and its borrowed_books row in a single transaction and return its id"""
+    try:
+        cursor.execute('''
+            INSERT INTO orders (user_id, total_amount, payment_method, payment_details, order_type)
+            VALUES (%s, %s, %s, %s, 'borrow')
+        ''', (user_id, fee, payment_method, payment_details))
+        order_id = cursor.lastrowid
+
+        cursor.execute('''
+            INSERT INTO borrowed_books (user_id, book_id, borrow_date, due_date, order_id)
+            VALUES (%s, %s, NOW(), DATE_ADD(NOW(), INTERVAL %s DAY), %s)
+        ''', (user_id, book_id, days, order_id))
+
+        connection.commit()
+        return order_id
+    except Exception:
+        connection.rollback()
+        raise
@@ -0,0 +1,381 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urljoin, urlsplit
+
+import MySQLdb.cursors
+import requests
+from flask import Response, abort, redirect, request, send_file, url_for
+
+from http_client import http_client
+from telemetry import observe_external
+
+CONTENT_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+MAX_COVER_BYTES = 5 * 1024 * 1024
+BROWSER_MAX_AGE = 7 * 24 * 3600
+MAX_REDIRECTS = 3
+PLACEHOLDER = 'images/cover-placeholder.svg'
+
+# Only the catalogs we import from are fetched server-side; a host matches
+# itself and its subdomains. Open Library covers redirect to archive.org storage.
+COVER_HOSTS = tuple(
+    host.strip().lower()
+    for host in os.getenv('COVER_PROXY_HOSTS', 'covers.openlibrary.org,archive.org,gutenberg.org').split(',')
+    if host.strip()
+)
+
+
+class CoverUnavailable(Exception):
+    """Raised when the upstream has no usable image for a cover URL"""
+
+
+class DiskLRU:
+    """Size-bounded cache of cover images on disk, evicting the least recently served first
+
+    Files are named <key>-<etag>.<ext>, so the index can be rebuilt from a
+    directory listing after a restart with no metadata files. All workers
+    share the directory: a hit touches the file's mtime, and after writing
+    `rescan_ratio` of `max_bytes` a worker re-lists the directory and evicts
+    by mtime. The directory therefore stays within `max_bytes` plus at most
+    `rescan_ratio * max_bytes` per worker. A file removed by another worker
+    simply reads as a miss.
+    """
+
+    def __init__(self, directory, max_bytes, rescan_ratio=0.05):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_bytes = max_bytes * rescan_ratio
+        self._entries = OrderedDict()
+        self._size = 0
+        self._written = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        # Rebuild the index from the shared directory, least recently served first
+        files = []
+        for name in os.listdir(self.directory):
+            stem, _, ext = name.partition('.')
+            key, _, etag = stem.partition('-')
+            if not etag or ext not in CONTENT_TYPES.values():
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, key, name, etag, stat.st_size))
+        entries, size = OrderedDict(), 0
+        for _, key, name, etag, file_size in sorted(files):
+            previous = entries.pop(key, None)
+            if previous is not None:
+                size -= previous[2]
+            entries[key] = (name, etag, file_size)
+            size += file_size
+        with self._lock:
+            self._entries, self._size, self._written = entries, size, 0
+        self._evict()
+
+    def get(self, key):
+        """Return (path, etag) for a cached key and mark it recently used, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        name, etag, _ = entry
+        path = os.path.join(self.directory, name)
+        try:
+            # Other workers evict by mtime, so mark the file as recently served
+            os.utime(path)
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+        return path, etag
+
+    def put(self, key, data, ext):
+        """Store `data` under `key` and return (path, etag)"""
+        etag = hashlib.sha256(data).hexdigest()[:16]
+        name = f'{key}-{etag}.{ext}'
+        path = os.path.join(self.directory, name)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[2]
+            self._entries[key] = (name, etag, len(data))
+            self._size += len(data)
+            self._written += len(data)
+            rescan = self._written >= self.rescan_bytes
+        if previous is not None and previous[0] != name:
+            self._remove(previous[0])
+        if rescan:
+            # Pick up what the other workers have written since the last listing
+            self._load()
+        else:
+            self._evict()
+        return path, etag
+
+    def _forget(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= entry[2]
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        evicted = []
+        with self._lock:
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, (name, _, size) = self._entries.popitem(last=False)
+                self._size -= size
+                evicted.append(name)
+        for name in evicted:
+            self._remove(name)
+
+    def _placeholder(self):
+        # Upstream has no image; <img> tags have no fallback of their own
+        return redirect(url_for('static', filename=PLACEHOLDER))
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes}
+
+
+class NegativeCache:
+    """Remembers cover URLs that had no image, for `ttl` seconds"""
+
+    def __init__(self, ttl=3600, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._entries[key]
+                return False
+            return True
+
+    def add(self, key):
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one execution"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(timeout)
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+def allowed_upstream(url):
+    """True for http(s) URLs on one of the COVER_HOSTS"""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    return parts.scheme in ('http', 'https') and any(
+        host == allowed or host.endswith('.' + allowed) for allowed in COVER_HOSTS)
+
+
+def _upstream_params(url):
+    # Open Library serves a 1x1 placeholder for missing covers unless asked to 404;
+    # the 404 lets the proxy remember the miss and send the local placeholder
+    if urlsplit(url).netloc == 'covers.openlibrary.org':
+        return {'default': 'false'}
+    return None
+
+
+class CoverProxy:
+    """Serves external cover images from a local disk cache at /covers/<book_id>"""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, negative_ttl=3600, fetch_timeout=5):
+        self.max_bytes = max_bytes
+        self.fetch_timeout = fetch_timeout
+        self.negative = NegativeCache(ttl=negative_ttl)
+        self.flights = SingleFlight()
+        self.cache = None
+        self.mysql = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app, mysql, directory):
+        self.mysql = mysql
+        self.cache = DiskLRU(directory, self.max_bytes)
+
+        @app.route('/covers/<int:book_id>')
+        def book_cover(book_id):
+            return self.serve(book_id)
+
+        @app.template_global()
+        def cover_url(book):
+            """Local covers as stored, external ones through the caching proxy"""
+            cover = book.get('cover_image')
+            if cover and not cover.startswith('/'):
+                return url_for('book_cover', book_id=book['id'])
+            return cover
+
+    def _fetch(self, provider, url):
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            response = self._get(url)
+            with response:
+                if response.status_code == 404:
+                    outcome = 'missing'
+                    raise CoverUnavailable(f"{url} returned 404")
+                response.raise_for_status()
+                content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+                if content_type not in CONTENT_TYPES:
+                    outcome = 'missing'
+                    raise CoverUnavailable(f"{url} returned {content_type or 'no content type'}")
+                data = bytearray()
+                for chunk in response.iter_content(64 * 1024):
+                    data.extend(chunk)
+                    if len(data) > MAX_COVER_BYTES:
+                        outcome = 'missing'
+                        raise CoverUnavailable(f"{url} is larger than {MAX_COVER_BYTES} bytes")
+            return bytes(data), CONTENT_TYPES[content_type]
+        except CoverUnavailable:
+            outcome = 'missing'
+            raise
+        except requests.RequestException:
+            outcome = 'error'
+            raise
+        finally:
+            observe_external(provider, time.perf_counter() - started, outcome)
+
+    def _get(self, url):
+        # Redirects are followed by hand so every hop is checked against COVER_HOSTS
+        params = _upstream_params(url)
+        for _ in range(MAX_REDIRECTS + 1):
+            response = http_client.get(url, params=params, timeout=self.fetch_timeout,
+                                       stream=True, allow_redirects=False)
+            if not response.is_redirect:
+                return response
+            response.close()
+            url = urljoin(response.url, response.headers['Location'])
+            params = None
+            if not allowed_upstream(url):
+                raise CoverUnavailable(f"{response.url} redirected to disallowed host {url}")
+        raise CoverUnavailable(f"{url} redirected more than {MAX_REDIRECTS} times")
+
+    def _load(self, key, provider, url):
+        # Another request may have filled the cache while this one waited for the flight
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            data, ext = self._fetch(provider, url)
+        except CoverUnavailable as e:
+            print(f"Cover not available: {e}")
+            self.negative.add(key)
+            raise
+        return self.cache.put(key, data, ext)
+
+    def serve(self, book_id):
+        cursor = self.mysql.read_connection.cursor(MySQLdb.cursors.DictCursor)
+        cursor.execute('SELECT cover_image, source FROM books WHERE id = %s', (book_id,))
+        book = cursor.fetchone()
+        cursor.close()
+        if not book or not book['cover_image']:
+            abort(404)
+        url = book['cover_image']
+        if url.startswith('/'):
+            return redirect(url)
+        if not allowed_upstream(url):
+            # Never fetch arbitrary URLs from the server; let the browser load it directly
+            if urlsplit(url).scheme not in ('http', 'https'):
+                abort(404)
+            return redirect(url)
+
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        if key in self.negative:
+            return self._placeholder()
+
+        cached = self.cache.get(key)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is None:
+            try:
+                cached = self.flights.do(key, lambda: self._load(key, book['source'], url),
+                                         timeout=self.fetch_timeout * 2)
+            except CoverUnavailable:
+                return self._placeholder()
+            except Exception as e:
+                print(f"Error fetching cover for book {book_id}: {e}")
+                return redirect(url)
+
+        path, etag = cached
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = send_file(path, etag=False, conditional=False)
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = BROWSER_MAX_AGE
+        return response
+
+    def _placeholder(self):
+        # Upstream has no image; <img> tags have no fallback of their own
+        return redirect(url_for('static', filename=PLACEHOLDER))
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return dict(self.cache.stats(), hits=hits, misses=misses,
+                    negative_entries=len(self.negative))
+
+
+cover_proxy = CoverProxy(
+    max_bytes=int(os.getenv('COVER_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+    negative_ttl=int(os.getenv('COVER_NEGATIVE_TTL', 3600)),
+    fetch_timeout=float(os.getenv('COVER_FETCH_TIMEOUT', 5)),
+)
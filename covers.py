@@ -0,0 +1,161 @@
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import MySQLdb
+from flask import send_from_directory
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from catalog_cache import catalog_version
+from db_pool import PoolTimeout
+
+# Bounding boxes for the generated variants, the aspect ratio is kept
+COVER_SIZES = {
+    'thumb': (200, 300),
+    'medium': (480, 720),
+}
+JPEG_QUALITY = 82
+WEBP_QUALITY = 78
+COVER_URL_PREFIX = '/media/covers/'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Refuse decompression bombs before decoding them
+Image.MAX_IMAGE_PIXELS = 40_000_000
+
+_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png'}
+
+
+class InvalidCover(ValueError):
+    """Raised when an upload is not a JPEG or PNG image Pillow can read"""
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _encode(image, format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+def _flatten(image):
+    # JPEG has no alpha channel, so composite transparent PNGs onto white
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+class CoverPipeline:
+    """Stores uploaded covers under content-hash names and builds resized variants in the background
+
+    The original is written synchronously and is usable as `cover_image`
+    straight away. Thumbnail and medium JPEG/WebP variants are produced on a
+    worker pool and recorded on the book row when ready. Because a file name
+    is derived from its content, a name never points at different bytes and
+    every file is served with an immutable far-future Cache-Control header.
+    """
+
+    def __init__(self, workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='covers')
+        self.directory = None
+        self.mysql = None
+
+    def init_app(self, app, mysql, directory):
+        self.mysql = mysql
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        @app.route(f'{COVER_URL_PREFIX}<filename>')
+        def cover_file(filename):
+            response = send_from_directory(self.directory, filename, max_age=IMMUTABLE_MAX_AGE)
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+            return response
+
+    def save_original(self, file):
+        """Validate an uploaded file, store it under its content hash and return that name"""
+        data = file.read()
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                format = image.format
+                image.verify()
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+            raise InvalidCover(f"Cover image could not be read: {e}")
+        if format not in _EXTENSIONS:
+            raise InvalidCover("Cover image must be a JPEG or PNG")
+
+        name = f"{hashlib.sha256(data).hexdigest()[:24]}.{_EXTENSIONS[format]}"
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+        return name
+
+    def url(self, name):
+        return f'{COVER_URL_PREFIX}{name}'
+
+    def build_variants(self, name):
+        """Write the resized JPEG and WebP variants of a stored original and return their URLs"""
+        stem = name.rsplit('.', 1)[0]
+        variants = {}
+        with Image.open(os.path.join(self.directory, name)) as original:
+            # Honour camera orientation before resizing
+            image = _flatten(ImageOps.exif_transpose(original))
+        for size, box in COVER_SIZES.items():
+            jpeg_name, webp_name = f'{stem}-{size}.jpg', f'{stem}-{size}.webp'
+            jpeg_path = os.path.join(self.directory, jpeg_name)
+            webp_path = os.path.join(self.directory, webp_name)
+            if not (os.path.exists(jpeg_path) and os.path.exists(webp_path)):
+                resized = image.copy()
+                resized.thumbnail(box, Image.LANCZOS)
+                _write_atomic(jpeg_path, _encode(resized, 'JPEG', quality=JPEG_QUALITY,
+                                                 optimize=True, progressive=True))
+                _write_atomic(webp_path, _encode(resized, 'WEBP', quality=WEBP_QUALITY, method=4))
+            variants[f'cover_{size}'] = self.url(jpeg_name)
+            variants[f'cover_{size}_webp'] = self.url(webp_name)
+        return variants
+
+    def schedule(self, book_id, name):
+        """Build the variants for a book's new cover on the worker pool"""
+        return self.executor.submit(self._process, book_id, name)
+
+    def _process(self, book_id, name):
+        try:
+            variants = self.build_variants(name)
+        except (OSError, ValueError) as e:
+            print(f"Error building cover variants for book {book_id}: {e}")
+            return
+
+        raw = None
+        try:
+            raw = self.mysql.pool.acquire()
+            cursor = raw.cursor()
+            # Skip the update if the cover was replaced while the variants were built
+            cursor.execute('''
+                UPDATE books
+                SET cover_thumb = %s, cover_thumb_webp = %s, cover_medium = %s, cover_medium_webp = %s
+                WHERE id = %s AND cover_image = %s
+            ''', (variants['cover_thumb'], variants['cover_thumb_webp'],
+                  variants['cover_medium'], variants['cover_medium_webp'],
+                  book_id, self.url(name)))
+            version = catalog_version.bump(cursor) if cursor.rowcount else None
+            raw.commit()
+            if version is not None:
+                catalog_version.advance(version)
+            cursor.close()
+        except (MySQLdb.Error, PoolTimeout) as e:
+            # The files stay on disk, so scheduling the book again only redoes the UPDATE
+            print(f"Error recording cover variants for book {book_id}: {e}")
+        finally:
+            if raw is not None:
+                self.mysql.pool.release(raw)
+
+
+cover_pipeline = CoverPipeline(workers=int(os.getenv('COVER_WORKERS', 2)))
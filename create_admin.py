@@ -1,4 +1,3 @@
-from flask_mysqldb import MySQL
 import bcrypt
 from dotenv import load_dotenv
 import os
@@ -0,0 +1,440 @@
+import itertools
+import os
+import threading
+import time
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import g, request, session
+
+from sql_metrics import InstrumentedConnection
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the wait timeout"""
+
+
+class _PooledConnection:
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """Bounded pool of MySQLdb connections with validation and lifetime recycling
+
+    Connections idle for longer than `ping_after` seconds are pinged before
+    being handed out; connections older than `max_lifetime` are closed and
+    replaced. Callers wait up to `wait_timeout` seconds for a free connection
+    once `max_size` are checked out.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, max_lifetime=1800,
+                 wait_timeout=5.0, ping_after=30.0, name='primary'):
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.wait_timeout = wait_timeout
+        self.ping_after = ping_after
+        self.name = name
+        self._idle = []
+        self._in_use = {}
+        self._opening = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'failed_pings': 0,
+            'timeouts': 0,
+            'waiting': 0,
+            'total_wait_time': 0.0,
+            'max_wait_time': 0.0,
+        }
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def fill(self):
+        """Open connections until at least `min_size` exist"""
+        while True:
+            with self._cond:
+                if self._size() >= self.min_size:
+                    return
+                self._opening += 1
+            pooled = self._open()
+            with self._cond:
+                self._opening -= 1
+                if pooled is not None:
+                    self._idle.append(pooled)
+                    self._cond.notify()
+            if pooled is None:
+                return
+
+    def _open(self):
+        try:
+            pooled = _PooledConnection(self.connect())
+        except MySQLdb.Error as e:
+            print(f"Error opening MySQL connection for pool {self.name}: {e}")
+            return None
+        with self._cond:
+            self._stats['created'] += 1
+        return pooled
+
+    def _close(self, pooled):
+        try:
+            pooled.raw.close()
+        except MySQLdb.Error:
+            pass
+
+    def _usable(self, pooled):
+        now = time.monotonic()
+        if now - pooled.created_at > self.max_lifetime:
+            with self._cond:
+                self._stats['recycled'] += 1
+            return False
+        if now - pooled.last_used > self.ping_after:
+            try:
+                pooled.raw.ping()
+            except MySQLdb.Error:
+                with self._cond:
+                    self._stats['failed_pings'] += 1
+                return False
+        return True
+
+    def acquire(self):
+        """Check out a validated connection, waiting up to `wait_timeout` seconds"""
+        started = time.monotonic()
+        deadline = started + self.wait_timeout
+        while True:
+            pooled = None
+            with self._cond:
+                while not self._idle and self._size() >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"No connection available in pool {self.name} after {self.wait_timeout}s")
+                    self._stats['waiting'] += 1
+                    self._cond.wait(remaining)
+                    self._stats['waiting'] -= 1
+                if self._idle:
+                    # Most recently used first, so surplus connections age out
+                    pooled = self._idle.pop()
+                else:
+                    self._opening += 1
+
+            if pooled is None:
+                pooled = self._open()
+                with self._cond:
+                    self._opening -= 1
+                    if pooled is None:
+                        self._cond.notify()
+                if pooled is None:
+                    raise MySQLdb.OperationalError(f"Could not open a connection for pool {self.name}")
+            elif not self._usable(pooled):
+                self._close(pooled)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._in_use[id(pooled.raw)] = pooled
+                self._stats['checkouts'] += 1
+                self._stats['total_wait_time'] += waited
+                self._stats['max_wait_time'] = max(self._stats['max_wait_time'], waited)
+            return pooled.raw
+
+    def release(self, raw):
+        """Return a connection, discarding any uncommitted work"""
+        with self._cond:
+            pooled = self._in_use.pop(id(raw), None)
+        if pooled is None:
+            return
+        try:
+            raw.rollback()
+            keep = time.monotonic() - pooled.created_at <= self.max_lifetime
+        except MySQLdb.Error:
+            keep = False
+        with self._cond:
+            if keep:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+            else:
+                self._stats['recycled'] += 1
+            self._cond.notify()
+        if not keep:
+            self._close(pooled)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'name': self.name,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'size': self._size(),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        if stats['checkouts']:
+            stats['avg_wait_time'] = stats['total_wait_time'] / stats['checkouts']
+        return stats
+
+
+class ReplicaSet:
+    """Round-robin read routing across replica pools, skipping replicas that lag too far
+
+    Each replica's lag is read from SHOW REPLICA STATUS at most once per
+    `check_interval` seconds, on the connection about to be used.
+    """
+
+    def __init__(self, pools, max_lag=5, check_interval=5.0):
+        self.pools = pools
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag = {pool.name: (None, 0.0) for pool in pools}
+        self._order = itertools.cycle(range(len(pools)))
+        self._lock = threading.Lock()
+
+    def _read_lag(self, raw):
+        cursor = raw.cursor(MySQLdb.cursors.DictCursor)
+        try:
+            try:
+                cursor.execute('SHOW REPLICA STATUS')
+                row = cursor.fetchone()
+                return row and row.get('Seconds_Behind_Source')
+            except MySQLdb.Error:
+                # Servers older than 8.0.22 only know the legacy statement
+                cursor.execute('SHOW SLAVE STATUS')
+                row = cursor.fetchone()
+                return row and row.get('Seconds_Behind_Master')
+        finally:
+            cursor.close()
+
+    def _healthy(self, pool, raw):
+        with self._lock:
+            lag, checked_at = self._lag[pool.name]
+            due = time.monotonic() - checked_at >= self.check_interval
+        if due:
+            try:
+                lag = self._read_lag(raw)
+            except MySQLdb.Error as e:
+                print(f"Could not read replication lag from {pool.name}: {e}")
+                lag = None
+            with self._lock:
+                self._lag[pool.name] = (lag, time.monotonic())
+        # NULL lag means replication is stopped or broken
+        return lag is not None and lag <= self.max_lag
+
+    def acquire(self):
+        """Return (pool, connection) for the next healthy replica, or (None, None)"""
+        for _ in range(len(self.pools)):
+            with self._lock:
+                pool = self.pools[next(self._order)]
+            try:
+                raw = pool.acquire()
+            except (PoolTimeout, MySQLdb.Error) as e:
+                print(f"Skipping replica {pool.name}: {e}")
+                continue
+            if self._healthy(pool, raw):
+                return pool, raw
+            pool.release(raw)
+        return None, None
+
+    def stats(self):
+        with self._lock:
+            lags = dict(self._lag)
+        return [dict(pool.stats(), lag=lags[pool.name][0]) for pool in self.pools]
+
+
+class _PrimaryConnection(InstrumentedConnection):
+    """Request's primary connection; remembers whether anything was committed on it"""
+
+    def commit(self):
+        self.raw.commit()
+        g._mysql_committed = True
+
+
+class _PrimaryReadCursor:
+    """Cursor on a connection borrowed for one short read, returned to the pool on close()"""
+
+    def __init__(self, pool, raw, cursor):
+        self._pool = pool
+        self._raw = raw
+        self._cursor = cursor
+
+    def close(self):
+        try:
+            self._cursor.close()
+        finally:
+            self._pool.release(self._raw)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _PrimaryReads:
+    """Borrows a primary connection per cursor, see PooledMySQL.primary_read_connection"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, *args, **kwargs):
+        raw = self.pool.acquire()
+        try:
+            cursor = InstrumentedConnection(raw).cursor(*args, **kwargs)
+        except Exception:
+            self.pool.release(raw)
+            raise
+        return _PrimaryReadCursor(self.pool, raw, cursor)
+
+
+class PooledMySQL:
+    """Drop-in replacement for flask_mysqldb.MySQL backed by a ConnectionPool
+
+    `mysql.connection` checks a primary connection out on first use in an app
+    context and returns it to the pool when the context tears down.
+    `mysql.read_connection` routes to a replica when MYSQL_REPLICA_HOSTS is
+    set, except once the request has used the primary, or for a few seconds
+    after the session last committed a write (read-your-writes).
+    """
+
+    def __init__(self, app=None):
+        self.pool = None
+        self.replicas = None
+        self._filled_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def _pool_options(self, config):
+        return {
+            'min_size': int(config.get('MYSQL_POOL_MIN_SIZE', 1)),
+            'max_size': int(config.get('MYSQL_POOL_MAX_SIZE', 10)),
+            'max_lifetime': float(config.get('MYSQL_POOL_MAX_LIFETIME', 1800)),
+            'wait_timeout': float(config.get('MYSQL_POOL_WAIT_TIMEOUT', 5)),
+            'ping_after': float(config.get('MYSQL_POOL_PING_AFTER', 30)),
+        }
+
+    def _connector(self, config, host, port, user, password):
+        def connect():
+            return MySQLdb.connect(
+                host=host,
+                user=user,
+                passwd=password or '',
+                db=config.get('MYSQL_DB'),
+                port=port,
+                charset=config.get('MYSQL_CHARSET', 'utf8mb4'),
+                connect_timeout=int(config.get('MYSQL_CONNECT_TIMEOUT', 5)),
+            )
+        return connect
+
+    def init_app(self, app):
+        config = app.config
+        options = self._pool_options(config)
+
+        self.pool = ConnectionPool(
+            self._connector(config,
+                            config.get('MYSQL_HOST') or 'localhost',
+                            int(config.get('MYSQL_PORT') or 3306),
+                            config.get('MYSQL_USER'),
+                            config.get('MYSQL_PASSWORD')),
+            name='primary',
+            **options
+        )
+
+        replica_pools = []
+        for entry in (config.get('MYSQL_REPLICA_HOSTS') or '').split(','):
+            if not entry.strip():
+                continue
+            host, _, port = entry.strip().partition(':')
+            replica_pools.append(ConnectionPool(
+                self._connector(config, host, int(port or 3306),
+                                config.get('MYSQL_REPLICA_USER') or config.get('MYSQL_USER'),
+                                config.get('MYSQL_REPLICA_PASSWORD') or config.get('MYSQL_PASSWORD')),
+                name=f"replica:{entry.strip()}",
+                **options
+            ))
+        if replica_pools:
+            self.replicas = ReplicaSet(
+                replica_pools,
+                max_lag=float(config.get('MYSQL_REPLICA_MAX_LAG', 5)),
+                check_interval=float(config.get('MYSQL_REPLICA_LAG_CHECK_INTERVAL', 5)),
+            )
+        self.sticky_seconds = float(config.get('MYSQL_READ_YOUR_WRITES_SECONDS', 10))
+
+        app.before_request(self._fill_pool)
+        app.after_request(self._remember_primary_use)
+        app.teardown_appcontext(self.teardown)
+
+    def _fill_pool(self):
+        # Warm up on each process's first request; connections opened at import
+        # would be inherited by every forked worker and share one socket
+        if self._filled_pid != os.getpid():
+            self._filled_pid = os.getpid()
+            self.pool.fill()
+
+    @property
+    def connection(self):
+        if '_mysql_connection' not in g:
+            g._mysql_connection = _PrimaryConnection(self.pool.acquire())
+        return g._mysql_connection
+
+    @property
+    def primary_read_connection(self):
+        """Primary connection for small reads that must never lag, such as cache versions
+
+        Unlike `connection`, using it does not send the rest of the request or
+        the session's later reads to the primary. Without replicas this is the
+        request's own primary connection. With them, a connection is only
+        checked out while a cursor is open, so the request never holds two
+        primary pool slots at once.
+        """
+        if '_mysql_connection' in g or self.replicas is None:
+            return self.connection
+        return _PrimaryReads(self.pool)
+
+    def reading_replica(self):
+        """True when `read_connection` has been routed to a replica in this request"""
+        return '_mysql_read_connection' in g
+
+    @property
+    def read_connection(self):
+        if '_mysql_connection' in g or self.replicas is None:
+            return self.connection
+        if session.get('read_primary_until', 0) > time.time():
+            return self.connection
+        if '_mysql_read_connection' not in g:
+            pool, raw = self.replicas.acquire()
+            if raw is None:
+                return self.connection
+            g._mysql_read_pool = pool
+            g._mysql_read_connection = InstrumentedConnection(raw)
+        return g._mysql_read_connection
+
+    def _remember_primary_use(self, response):
+        # Keep this session's reads on the primary until replicas have caught up
+        # with its writes. Reads that only fell back to the primary don't count,
+        # and anonymous GETs never get the cookie, so public pages stay cacheable
+        if self.replicas is None or not g.get('_mysql_committed'):
+            return response
+        if request.method in ('GET', 'HEAD') and not session.get('loggedin'):
+            return response
+        session['read_primary_until'] = time.time() + self.sticky_seconds
+        return response
+
+    def teardown(self, exception):
+        connection = g.pop('_mysql_connection', None)
+        if connection is not None:
+            self.pool.release(connection.raw)
+        read_connection = g.pop('_mysql_read_connection', None)
+        read_pool = g.pop('_mysql_read_pool', None)
+        if read_connection is not None:
+            read_pool.release(read_connection.raw)
+
+    def stats(self):
+        return {
+            'primary': self.pool.stats(),
+            'replicas': self.replicas.stats() if self.replicas else [],
+        }
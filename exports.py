@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import zlib
+
+FETCH_SIZE = 1000
+
+# Exportable tables: the date column used for range filters and the columns to dump
+EXPORTS = {
+    'orders': {
+        'date_column': 'order_date',
+        # payment_details holds card numbers and phone numbers; never export it
+        'columns': ['id', 'user_id', 'total_amount', 'payment_method', 'order_type', 'order_date'],
+    },
+    'borrowed_books': {
+        'date_column': 'borrow_date',
+        'columns': ['id', 'user_id', 'book_id', 'order_id', 'borrow_date', 'due_date', 'return_date'],
+    },
+    'purchased_books': {
+        'date_column': 'purchase_date',
+        'columns': ['id', 'user_id', 'book_id', 'purchase_date', 'price'],
+    },
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_query(table, start=None, end=None):
+    """Build the SELECT for an export, filtered to [start, end] by the table's date column"""
+    spec = EXPORTS[table]
+    date_column = spec['date_column']
+    query = f"SELECT {', '.join(spec['columns'])} FROM {table} WHERE 1=1"
+    params = []
+    if start:
+        query += f' AND {date_column} >= %s'
+        params.append(start)
+    if end:
+        query += f' AND {date_column} < DATE_ADD(%s, INTERVAL 1 DAY)'
+        params.append(end)
+    query += ' ORDER BY id'
+    return query, tuple(params)
+
+
+def iter_rows(cursor):
+    """Yield rows from an unbuffered cursor in FETCH_SIZE chunks"""
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+
+def csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([row[column] for column in columns])
+        if count % FETCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(columns, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({column: row[column] for column in columns}, default=str))
+        if len(lines) == FETCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def encode_chunks(chunks, compress=False):
+    """Encode text chunks as UTF-8, optionally as one continuous gzip stream"""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(cursor, table, fmt, compress=False):
+    """Stream `table` from an executed server-side cursor in the requested format"""
+    columns = EXPORTS[table]['columns']
+    rows = iter_rows(cursor)
+    chunks = csv_chunks(columns, rows) if fmt == 'csv' else ndjson_chunks(columns, rows)
+    return encode_chunks(chunks, compress)
@@ -0,0 +1,354 @@
+import mysql.connector
+from mysql.connector import Error
+import os
+import argparse
+import bisect
+import hashlib
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from catalog_cache import catalog_version
+import stats
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_PASSWORD = 'synthetic'
+BORROW_FEE = 2.00
+
+# Words used for titles and descriptions
+VOCABULARY = '''
+    adventure ancient archive atlas autumn balance beacon border bridge castle
+    century chronicle circle city coast code compass courage crown crystal dawn
+    desert destiny dream echo empire engine forest fortune frontier garden
+    harbor harvest horizon island journey kingdom legacy legend library light
+    machine market memory mountain mystery night ocean orbit palace pattern
+    quest river secret shadow signal silver spring star storm summer theory
+    thunder tide tower valley voyage wander whisper winter wisdom world
+'''.split()
+
+FIRST_NAMES = '''
+    Ada Alan Amara Ben Chen Clara Dmitri Elena Farah Grace Hiro Ines Jonas Kofi
+    Lena Malik Nadia Omar Priya Rosa Sam Tariq Uma Victor Wen Yusuf Zoe
+'''.split()
+
+LAST_NAMES = '''
+    Abbott Brandt Castillo Dubois Eriksen Fischer Garcia Haddad Ivanova Jensen
+    Kimura Larsen Moreau Nakamura Okafor Petrov Quinn Rossi Silva Tanaka Usman
+    Varga Weber Xu Yilmaz Zhang
+'''.split()
+
+# Column lists per table; generated columns (title_key, description_snippet) are left to MySQL
+COLUMNS = {
+    'users': ('id', 'username', 'email', 'password', 'is_admin', 'last_login', 'created_at'),
+    'books': ('id', 'title', 'authors', 'description', 'source', 'category_id', 'price', 'created_at'),
+    'orders': ('id', 'user_id', 'total_amount', 'payment_method', 'payment_details', 'order_type',
+               'order_date'),
+    'order_items': ('order_id', 'book_id', 'quantity', 'price'),
+    'purchased_books': ('user_id', 'book_id', 'purchase_date', 'price'),
+    'borrowed_books': ('id', 'user_id', 'book_id', 'order_id', 'borrow_date', 'due_date',
+                       'return_date'),
+    'refunds': ('borrow_id', 'amount', 'refund_date', 'reason'),
+}
+
+# Payment methods as stored by process_payment: the raw card number or phone number
+PAYMENT_METHODS = [
+    ('card', lambda rng: f"4{rng.randint(0, 10**15 - 1):015d}"),
+    ('alipay', lambda rng: f"1{rng.randint(0, 10**10 - 1):010d}"),
+    ('wepay', lambda rng: f"1{rng.randint(0, 10**10 - 1):010d}"),
+]
+
+
+def get_db_connection():
+    try:
+        connection = mysql.connector.connect(
+            host=os.getenv('MYSQL_HOST', 'localhost'),
+            user=os.getenv('MYSQL_USER', 'root'),
+            password=os.getenv('MYSQL_PASSWORD', ''),
+            database=os.getenv('MYSQL_DB', 'elibrary'),
+            allow_local_infile=True
+        )
+        return connection
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
+
+
+class SkewedChoice:
+    """Draws items with Zipf-like popularity: the item at rank r has weight 1 / r**exponent
+
+    Items are shuffled before ranking so popularity is not tied to id order.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.rng = rng
+        self.cum_weights = []
+        total = 0.0
+        for rank in range(1, len(self.items) + 1):
+            total += 1.0 / rank ** exponent
+            self.cum_weights.append(total)
+        self.total = total
+
+    def pick(self):
+        index = bisect.bisect(self.cum_weights, self.rng.random() * self.total)
+        return self.items[min(index, len(self.items) - 1)]
+
+    def sample(self, k):
+        """Up to `k` distinct items"""
+        picked = []
+        for _ in range(k * 3):
+            item = self.pick()
+            if item not in picked:
+                picked.append(item)
+                if len(picked) == k:
+                    break
+        return picked
+
+
+def _format(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def _escape(value):
+    # Default LOAD DATA format: tab-separated, backslash escapes, \N for NULL
+    if value is None:
+        return '\\N'
+    return str(_format(value)).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+class InfileSink:
+    """Streams rows into one tab-separated file per table, loaded with LOAD DATA LOCAL INFILE"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}
+        self.counts = {}
+
+    def add(self, table, row):
+        if table not in self.files:
+            self.files[table] = open(os.path.join(self.directory, f'{table}.tsv'), 'w',
+                                     encoding='utf-8', newline='\n')
+            self.counts[table] = 0
+        self.files[table].write('\t'.join(_escape(value) for value in row) + '\n')
+        self.counts[table] += 1
+
+    def finish(self, cursor):
+        for table, file in self.files.items():
+            file.close()
+            started = time.perf_counter()
+            cursor.execute(f'''
+                LOAD DATA LOCAL INFILE %s INTO TABLE {table}
+                CHARACTER SET utf8mb4
+                ({', '.join(COLUMNS[table])})
+            ''', (file.name,))
+            print(f"Loaded {self.counts[table]} {table} rows in {time.perf_counter() - started:.1f}s")
+
+
+class InsertSink:
+    """Buffers rows per table and writes them with multi-row INSERTs of `batch_size` rows"""
+
+    def __init__(self, cursor, batch_size=5000):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+
+    def _flush(self, table):
+        rows = self.buffers[table]
+        if rows:
+            columns = COLUMNS[table]
+            # mysql.connector rewrites an INSERT executemany into a single multi-row statement
+            self.cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                rows
+            )
+            self.counts[table] += len(rows)
+            rows.clear()
+
+    def add(self, table, row):
+        if table not in self.buffers:
+            self.buffers[table] = []
+            self.counts[table] = 0
+        self.buffers[table].append(tuple(_format(value) for value in row))
+        if len(self.buffers[table]) >= self.batch_size:
+            self._flush(table)
+
+    def finish(self, cursor):
+        for table in self.buffers:
+            self._flush(table)
+            print(f"Inserted {self.counts[table]} {table} rows")
+
+
+def _next_id(cursor, table):
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def generate_users(sink, rng, first_id, count, now, days, password):
+    hashed = hashlib.sha256(password.encode('utf-8')).hexdigest()
+    for user_id in range(first_id, first_id + count):
+        created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+        last_login = None
+        if rng.random() < 0.8:
+            last_login = created_at + (now - created_at) * rng.random()
+        sink.add('users', (user_id, f'synthetic_{user_id}', f'synthetic_{user_id}@example.com',
+                           hashed, 0, last_login, created_at))
+
+
+def generate_books(sink, rng, first_id, count, now, days, category_ids):
+    authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(max(1, count // 8))]
+    author_choice = SkewedChoice(authors, 1.0, rng)
+    category_choice = SkewedChoice(category_ids, 0.6, rng)
+    prices = {}
+    for book_id in range(first_id, first_id + count):
+        words = rng.sample(VOCABULARY, 3)
+        # The id keeps (source, title) unique for the deduplication key
+        title = f"The {words[0].title()} of {words[1].title()} and {words[2].title()} #{book_id}"
+        description = ' '.join(rng.choices(VOCABULARY, k=rng.randint(20, 60))).capitalize() + '.'
+        price = round(rng.uniform(4.99, 59.99), 2)
+        prices[book_id] = price
+        created_at = now - timedelta(seconds=int((first_id + count - book_id) / count * days * 86400))
+        sink.add('books', (book_id, title, author_choice.pick(), description,
+                           rng.choice(('openlibrary', 'gutenberg')), category_choice.pick(), price,
+                           created_at))
+    return prices
+
+
+def generate_orders(sink, rng, first_ids, count, now, days, user_choice, book_choice, prices,
+                    borrow_share):
+    """Purchase and borrow orders with their items, ownership rows and early-return refunds"""
+    order_id, borrow_id = first_ids['orders'], first_ids['borrowed_books']
+    start = now - timedelta(days=days)
+    span = (now - start).total_seconds()
+    for i in range(count):
+        # Ids ascend with time, like orders placed through the app
+        order_date = start + timedelta(seconds=span * (i + rng.random()) / count)
+        user_id = user_choice.pick()
+        payment_method, details = rng.choice(PAYMENT_METHODS)
+
+        if rng.random() < borrow_share:
+            book_id = book_choice.pick()
+            loan_days = rng.choice((7, 14, 30))
+            due_date = order_date + timedelta(days=loan_days)
+            return_date = None
+            # Most past loans have come back, some current ones already have
+            if rng.random() < (0.9 if due_date < now else 0.3):
+                return_date = min(now, order_date + timedelta(seconds=rng.randint(3600, loan_days * 86400)))
+            sink.add('orders', (order_id, user_id, BORROW_FEE, payment_method, details(rng), 'borrow',
+                                order_date))
+            sink.add('borrowed_books', (borrow_id, user_id, book_id, order_id, order_date, due_date,
+                                        return_date))
+            if return_date is not None and rng.random() < 0.2:
+                days_remaining = (due_date - return_date).days
+                if days_remaining > 0:
+                    sink.add('refunds', (borrow_id, round(BORROW_FEE * days_remaining / loan_days, 2),
+                                         return_date, f'Early return refund for {days_remaining} days'))
+            borrow_id += 1
+        else:
+            items = book_choice.sample(rng.choice((1, 1, 1, 2, 2, 3, 4)))
+            total = 0
+            for book_id in items:
+                quantity = 1 if rng.random() < 0.9 else 2
+                total += prices[book_id] * quantity
+                sink.add('order_items', (order_id, book_id, quantity, prices[book_id]))
+                sink.add('purchased_books', (user_id, book_id, order_date, prices[book_id]))
+            sink.add('orders', (order_id, user_id, round(total, 2), payment_method, details(rng),
+                                'purchase', order_date))
+        order_id += 1
+
+
+def generate(connection, books=100_000, users=10_000, orders=50_000, days=365, seed=42,
+             method='infile', batch_size=5000, borrow_share=0.3, password=DEFAULT_PASSWORD):
+    """Append synthetic rows to every catalog and activity table and return the row counts
+
+    Ids are assigned here, continuing after the current maxima, so no rows
+    have to be read back and every foreign key points at a generated row.
+    """
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    cursor = connection.cursor()
+    directory = tempfile.mkdtemp(prefix='elibrary_generate_') if method == 'infile' else None
+
+    try:
+        cursor.execute("SELECT id FROM book_categories")
+        category_ids = [row[0] for row in cursor.fetchall()]
+        if not category_ids:
+            raise ValueError("book_categories is empty, run setup_db.py first")
+        first_ids = {table: _next_id(cursor, table)
+                     for table in ('users', 'books', 'orders', 'borrowed_books')}
+
+        # Every generated reference points at a generated row, so skip per-row checks
+        cursor.execute("SET SESSION foreign_key_checks = 0")
+        cursor.execute("SET SESSION unique_checks = 0")
+        sink = InfileSink(directory) if method == 'infile' else InsertSink(cursor, batch_size)
+
+        started = time.perf_counter()
+        generate_users(sink, rng, first_ids['users'], users, now, days, password)
+        prices = generate_books(sink, rng, first_ids['books'], books, now, days, category_ids)
+        user_choice = SkewedChoice(range(first_ids['users'], first_ids['users'] + users), 0.8, rng)
+        book_choice = SkewedChoice(prices.keys(), 1.1, rng)
+        generate_orders(sink, rng, first_ids, orders, now, days, user_choice, book_choice, prices,
+                        borrow_share)
+        print(f"Generated rows in {time.perf_counter() - started:.1f}s")
+
+        sink.finish(cursor)
+        cursor.execute("SET SESSION foreign_key_checks = 1")
+        cursor.execute("SET SESSION unique_checks = 1")
+
+        # Bulk loads bypass the incremental counters and the catalog cache version
+        stats.rebuild(cursor)
+        catalog_version.bump(cursor)
+        connection.commit()
+
+        for table in COLUMNS:
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+        return sink.counts
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(books, users, orders, days, seed, method, batch_size):
+    connection = get_db_connection()
+    if not connection:
+        return
+
+    started = time.perf_counter()
+    try:
+        counts = generate(connection, books=books, users=users, orders=orders, days=days, seed=seed,
+                          method=method, batch_size=batch_size)
+    except Error as e:
+        print(f"Error loading synthetic data: {e}")
+        if method == 'infile':
+            print("LOAD DATA LOCAL INFILE needs local_infile=ON on the server, or use --method insert")
+        return
+    finally:
+        connection.close()
+
+    print(f"Loaded {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic books, users and orders for scale testing")
+    parser.add_argument('--books', type=int, default=100_000, help="books to generate")
+    parser.add_argument('--users', type=int, default=10_000, help="users to generate")
+    parser.add_argument('--orders', type=int, default=50_000, help="purchase and borrow orders to generate")
+    parser.add_argument('--days', type=int, default=365, help="history span in days")
+    parser.add_argument('--seed', type=int, default=42, help="random seed, for reproducible data")
+    parser.add_argument('--method', choices=('infile', 'insert'), default='infile',
+                        help="LOAD DATA LOCAL INFILE or multi-row INSERTs")
+    parser.add_argument('--batch-size', type=int, default=5000, help="rows per INSERT with --method insert")
+    args = parser.parse_args()
+    main(args.books, args.users, args.orders, args.days, args.seed, args.method, args.batch_size)
@@ -0,0 +1,145 @@
+"""Conditional GET and response compression
+
+Pages wrapped in `conditional_page` get a weak ETag built from a content
+version (for example the catalog version) and the parts of the session that
+the layout renders. A matching If-None-Match is answered with 304 before the
+view runs. Every compressible response above COMPRESS_MIN_SIZE bytes is
+compressed with brotli when the client accepts it and the `brotli` package
+is installed, and with gzip otherwise.
+"""
+import gzip
+import hashlib
+import os
+import subprocess
+from functools import wraps
+
+from flask import Response, make_response, request, session
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+ANONYMOUS_MAX_AGE = int(os.getenv('ANONYMOUS_PAGE_MAX_AGE', 60))
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+def _release():
+    """APP_RELEASE when set, otherwise the git commit plus the newest code or template mtime
+
+    The mtime covers deploys that copy files without a .git directory and
+    uncommitted edits during development.
+    """
+    if os.getenv('APP_RELEASE'):
+        return os.getenv('APP_RELEASE')
+    base = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=base, text=True,
+                                         stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+    paths = [os.path.join(base, name) for name in os.listdir(base) if name.endswith('.py')]
+    paths.extend(os.path.join(root, name)
+                 for root, _, names in os.walk(os.path.join(base, 'templates'))
+                 for name in names)
+    return f"{commit}:{max(os.path.getmtime(path) for path in paths)}"
+
+
+# Changes whenever the code or templates are redeployed, so stale ETags stop matching
+RELEASE = _release()
+
+
+def _viewer():
+    # Everything the shared layout renders from the session
+    if not session.get('loggedin'):
+        return 'anonymous'
+    return f"{session.get('id')}:{bool(session.get('is_admin'))}:{session.get('cart_count', 0)}"
+
+
+def page_etag(version):
+    """Weak ETag for a page rendered from `version` for the current viewer"""
+    raw = f"{RELEASE}|{version}|{_viewer()}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def _apply_cache_control(response):
+    if session.get('loggedin'):
+        # Personalised pages stay out of shared caches but can still be revalidated
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = ANONYMOUS_MAX_AGE
+    response.vary.add('Cookie')
+
+
+def conditional_page(version, cacheable=None):
+    """Answer If-None-Match with 304 when `version(*args, **kwargs)` has not changed
+
+    Requests with pending flash messages always render, so the messages are
+    shown and consumed. When `cacheable(version)` is false after a render,
+    for example because the page was read from a lagging replica, the page is
+    sent without an ETag or cache headers.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            page_version = version(*args, **kwargs)
+            etag = page_etag(page_version)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if cacheable is not None and not cacheable(page_version):
+                    return response
+            response.set_etag(etag, weak=True)
+            _apply_cache_control(response)
+            return response
+        return wrapper
+    return decorator
+
+
+def _encoding(accept_encodings):
+    # Indexing an Accept header by value gives its quality, 0 when not accepted
+    if brotli is not None and accept_encodings['br'] > 0:
+        return 'br'
+    if accept_encodings['gzip'] > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """Compress a buffered response body in place when it is worth it"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,79 @@
+import os
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class JitteredRetry(Retry):
+    """urllib3 Retry with full jitter applied to the exponential backoff"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff > 0 else 0
+
+
+class HttpClient:
+    """Shared outbound HTTP client with per-host keep-alive pools, timeouts and retries"""
+
+    def __init__(self, pool_connections=10, pool_maxsize=20, connect_timeout=3.05,
+                 read_timeout=10, retries=3, backoff_factor=0.5, user_agent='E-Library/1.0'):
+        self.timeout = (connect_timeout, read_timeout)
+        retry = JitteredRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        # One adapter serves every host; urllib3 keeps a separate pool per host
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize,
+                              max_retries=retry)
+        self.session = self._session(adapter, user_agent)
+        # Deadline-bound callers get one attempt, so nothing keeps retrying after they give up
+        self.single_attempt_session = self._session(
+            HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0),
+            user_agent
+        )
+
+    def _session(self, adapter, user_agent):
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'User-Agent': user_agent,
+        })
+        return session
+
+    def _timeout(self, timeout):
+        # A single number caps the read timeout without loosening the connect timeout
+        if timeout is None:
+            return self.timeout
+        if isinstance(timeout, (int, float)):
+            return (min(self.timeout[0], timeout), timeout)
+        return timeout
+
+    def get(self, url, params=None, timeout=None, retry=True, **kwargs):
+        session = self.session if retry else self.single_attempt_session
+        return session.get(url, params=params, timeout=self._timeout(timeout), **kwargs)
+
+    def close(self):
+        self.session.close()
+        self.single_attempt_session.close()
+
+
+http_client = HttpClient(
+    pool_connections=int(os.getenv('HTTP_POOL_CONNECTIONS', 10)),
+    pool_maxsize=int(os.getenv('HTTP_POOL_MAXSIZE', 20)),
+    connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05)),
+    read_timeout=float(os.getenv('HTTP_READ_TIMEOUT', 10)),
+    retries=int(os.getenv('HTTP_RETRIES', 3)),
+    backoff_factor=float(os.getenv('HTTP_BACKOFF_FACTOR', 0.5)),
+)
@@ -0,0 +1,102 @@
+import unicodedata
+
+from catalog_cache import catalog_version
+
+EXTERNAL_SOURCES = ('openlibrary', 'gutenberg')
+TITLE_MAX_LENGTH = 255
+
+BOOK_COLUMNS = ('title', 'authors', 'description', 'cover_image', 'preview_link', 'source')
+
+
+def normalize_title(title):
+    """Collapse whitespace so titles compare the way the title_key column stores them"""
+    return ' '.join((title or '').split())[:TITLE_MAX_LENGTH]
+
+
+def title_key(title):
+    """Approximate the accent- and case-insensitive collation that compares title_key
+
+    Used to deduplicate a batch before it reaches MySQL. Rows are always
+    matched back through MySQL's own comparison, so a title this folds
+    differently from the collation still finds its stored row.
+    """
+    decomposed = unicodedata.normalize('NFKD', normalize_title(title))
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def _placeholders(count, width=1):
+    group = '(' + ', '.join(['%s'] * width) + ')' if width > 1 else '%s'
+    return ', '.join([group] * count)
+
+
+def _stored_rows(cursor, source, keys):
+    """Map each position in `keys` to the stored row its key collates equal to"""
+    # Joining on the column compares with its collation rather than the bytes Python sent
+    wanted = ' UNION ALL '.join(['SELECT %s AS position, %s AS title_key'] * len(keys))
+    params = [value for position, key in enumerate(keys) for value in (position, key)]
+    cursor.execute(f'''
+        SELECT wanted.position, b.*
+        FROM ({wanted}) wanted
+        JOIN books b ON b.title_key = wanted.title_key
+        WHERE b.source = %s
+    ''', params + [source])
+    rows = {}
+    for row in cursor.fetchall():
+        rows[row.pop('position')] = row
+    return rows
+
+
+def upsert_external_books(connection, cursor, source, books):
+    """Store a batch of external books and return their full rows in batch order
+
+    `cursor` must return dict rows. `books` are dicts with the BOOK_COLUMNS
+    keys (source is filled in). The batch is deduplicated against the unique
+    (source, title_key) index with one lookup, new rows go in as a single
+    multi-row INSERT ... ON DUPLICATE KEY UPDATE, and the whole batch commits
+    once.
+    """
+    if source not in EXTERNAL_SOURCES:
+        raise ValueError(f"Unknown external source: {source}")
+
+    batch = {}
+    for book in books:
+        title = normalize_title(book.get('title'))
+        key = title_key(title)
+        if title and key not in batch:
+            batch[key] = dict(book, title=title, source=source)
+    if not batch:
+        return []
+    keys = list(batch)
+
+    # Find which titles are already stored for this source
+    stored = _stored_rows(cursor, source, keys)
+    new_books = [batch[key] for position, key in enumerate(keys) if position not in stored]
+
+    if new_books:
+        values = []
+        for book in new_books:
+            values.extend(book.get(column) for column in BOOK_COLUMNS)
+        # A concurrent request may insert the same title first; keep its row and
+        # only fill in the links it is missing
+        cursor.execute(f'''
+            INSERT INTO books ({', '.join(BOOK_COLUMNS)})
+            VALUES {_placeholders(len(new_books), len(BOOK_COLUMNS))}
+            ON DUPLICATE KEY UPDATE
+                cover_image = COALESCE(cover_image, VALUES(cover_image)),
+                preview_link = COALESCE(preview_link, VALUES(preview_link))
+        ''', values)
+        # New books change the home page's latest-books block
+        version = catalog_version.bump(cursor)
+    connection.commit()
+    if new_books:
+        catalog_version.advance(version)
+        stored = _stored_rows(cursor, source, keys)
+
+    # Titles that only MySQL considers equal share one row; return it once
+    rows, seen = [], set()
+    for position in range(len(keys)):
+        row = stored.get(position)
+        if row is not None and row['id'] not in seen:
+            seen.add(row['id'])
+            rows.append(row)
+    return rows
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S'
+
+
+def encode_cursor(created_at, row_id):
+    """Encode a (created_at, id) position as an opaque URL-safe token"""
+    return f"{created_at.strftime(CURSOR_TIME_FORMAT)}-{row_id}"
+
+
+def decode_cursor(token):
+    """Decode a token from encode_cursor, returning None if it is malformed"""
+    if not token:
+        return None
+    try:
+        stamp, row_id = token.split('-', 1)
+        return datetime.strptime(stamp, CURSOR_TIME_FORMAT), int(row_id)
+    except ValueError:
+        return None
+
+
+def keyset_clause(cursor, time_column, id_column):
+    """SQL condition selecting rows strictly after `cursor` in DESC (time, id) order
+
+    Written as an expanded OR rather than a row constructor so MySQL can use a
+    range scan on the composite index.
+    """
+    created_at, row_id = cursor
+    sql = f'({time_column} < %s OR ({time_column} = %s AND {id_column} < %s))'
+    return sql, [created_at, created_at, row_id]
+
+
+def split_page(rows, page_size, time_key='created_at', id_key='id'):
+    """Trim a page fetched with LIMIT page_size + 1 and return (rows, next_cursor)"""
+    if len(rows) <= page_size:
+        return list(rows), None
+    rows = list(rows[:page_size])
+    last = rows[-1]
+    return rows, encode_cursor(last[time_key], last[id_key])
@@ -1,10 +1,17 @@
 import mysql.connector
 from mysql.connector import Error
-import requests
 import os
+import argparse
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 import time
 import random
+from http_client import http_client
+import stats
+from catalog_cache import catalog_version
 
 # Load environment variables
 load_dotenv()
@@ -21,6 +28,49 @@ CATEGORY_SUBJECTS = {
     'Technology': ['technology', 'computers', 'programming', 'engineering']
 }
 
+DEFAULT_CHECKPOINT = '.populate_checkpoint.json'
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class HostRateLimiter:
+    """One token bucket per upstream host"""
+
+    def __init__(self, rate=2.0, capacity=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.capacity)
+        bucket.acquire()
+
+rate_limiter = HostRateLimiter(rate=float(os.getenv('POPULATE_RATE_PER_HOST', 2)))
+
 def get_db_connection():
     try:
         connection = mysql.connector.connect(
@@ -35,57 +85,52 @@ def get_db_connection():
         return None
 
 def get_open_library_books(subject, limit=5):
+    """Fetch books for a subject; raises on network errors and non-2xx responses"""
+    url = f"http://openlibrary.org/subjects/{subject}.json?limit={limit}"
+    rate_limiter.acquire(url)
+    response = http_client.get(url)
+    response.raise_for_status()
     books = []
-    try:
-        url = f"http://openlibrary.org/subjects/{subject}.json?limit={limit}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            for work in data.get('works', []):
-                cover_id = work.get('cover_id')
-                cover_url = f"https://covers.openlibrary.org/b/id/{cover_id}-L.jpg" if cover_id else None
-                
-                book = {
-                    'title': work.get('title'),
-                    'authors': ', '.join([author.get('name', '') for author in work.get('authors', [])]),
-                    'description': work.get('description', ''),
-                    'cover_image': cover_url,
-                    'price': round(random.uniform(9.99, 49.99), 2)  # Random price
-                }
-                books.append(book)
-        time.sleep(1)  # Rate limiting
-    except Exception as e:
-        print(f"Error fetching from OpenLibrary: {e}")
+    for work in response.json().get('works', []):
+        cover_id = work.get('cover_id')
+        cover_url = f"https://covers.openlibrary.org/b/id/{cover_id}-L.jpg" if cover_id else None
+        
+        book = {
+            'title': work.get('title'),
+            'authors': ', '.join([author.get('name', '') for author in work.get('authors', [])]),
+            'description': work.get('description', ''),
+            'cover_image': cover_url,
+            'price': round(random.uniform(9.99, 49.99), 2)  # Random price
+        }
+        books.append(book)
     return books
 
 def get_gutenberg_books(subject, limit=5):
+    """Fetch books for a subject; raises on network errors and non-2xx responses"""
+    url = f"https://gutendex.com/books/?topic={subject}&languages=en"
+    rate_limiter.acquire(url)
+    response = http_client.get(url)
+    response.raise_for_status()
     books = []
-    try:
-        url = f"https://gutendex.com/books/?topic={subject}&languages=en"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            for result in data.get('results', [])[:limit]:
-                book = {
-                    'title': result.get('title'),
-                    'authors': ', '.join([author.get('name') for author in result.get('authors', [])]),
-                    'description': f"A classic book from Project Gutenberg. {result.get('title')} by {', '.join([author.get('name') for author in result.get('authors', [])])}",
-                    'cover_image': None,  # Gutenberg doesn't provide cover images
-                    'price': round(random.uniform(9.99, 49.99), 2)  # Random price
-                }
-                books.append(book)
-        time.sleep(1)  # Rate limiting
-    except Exception as e:
-        print(f"Error fetching from Gutenberg: {e}")
+    for result in response.json().get('results', [])[:limit]:
+        book = {
+            'title': result.get('title'),
+            'authors': ', '.join([author.get('name') for author in result.get('authors', [])]),
+            'description': f"A classic book from Project Gutenberg. {result.get('title')} by {', '.join([author.get('name') for author in result.get('authors', [])])}",
+            'cover_image': None,  # Gutenberg doesn't provide cover images
+            'price': round(random.uniform(9.99, 49.99), 2)  # Random price
+        }
+        books.append(book)
     return books
 
-def insert_book(cursor, book, category_id):
-    try:
-        sql = '''
-            INSERT INTO books (title, authors, description, cover_image, category_id, price)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        '''
-        values = (
+def insert_books(cursor, rows):
+    """Insert (book, category_id) pairs with a single executemany call"""
+    sql = '''
+        INSERT INTO books (title, authors, description, cover_image, category_id, price)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    '''
+    values = [
+        (
             book['title'],
             book['authors'],
             book['description'],
@@ -93,13 +138,59 @@ def insert_book(cursor, book, category_id):
             category_id,
             book['price']
         )
-        cursor.execute(sql, values)
-        return True
-    except Error as e:
-        print(f"Error inserting book: {e}")
-        return False
+        for book, category_id in rows
+    ]
+    cursor.executemany(sql, values)
+    return len(values)
+
+def load_checkpoint(path):
+    try:
+        with open(path, 'r') as file:
+            return set(json.load(file).get('completed', []))
+    except FileNotFoundError:
+        return set()
+    except (ValueError, OSError) as e:
+        print(f"Ignoring unreadable checkpoint {path}: {e}")
+        return set()
+
+def save_checkpoint(path, completed):
+    # Write to a temp file first so a crash never leaves a truncated checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump({'completed': sorted(completed)}, file)
+    os.replace(tmp_path, path)
 
-def main():
+def build_tasks(categories):
+    """One fetch task per (category, subject, provider)"""
+    tasks = []
+    for category in categories:
+        subjects = CATEGORY_SUBJECTS.get(category['name'], [category['name'].lower()])
+        for subject in subjects:
+            tasks.append((f"{category['name']}|{subject}|openlibrary", category, subject, 'openlibrary'))
+            tasks.append((f"{category['name']}|{subject}|gutenberg", category, subject, 'gutenberg'))
+    return tasks
+
+def fetch_task(subject, provider):
+    if provider == 'openlibrary':
+        return get_open_library_books(subject, limit=3)
+    return get_gutenberg_books(subject, limit=2)
+
+class Progress:
+    def __init__(self, total_tasks):
+        self.total_tasks = total_tasks
+        self.done_tasks = 0
+        self.failed_tasks = 0
+        self.inserted = 0
+        self.started = time.monotonic()
+
+    def report(self, final=False):
+        elapsed = time.monotonic() - self.started
+        rate = self.inserted / elapsed if elapsed > 0 else 0
+        label = "Finished" if final else "Progress"
+        print(f"{label}: {self.done_tasks}/{self.total_tasks} fetches ({self.failed_tasks} failed), "
+              f"{self.inserted} books inserted, {rate:.1f} books/s, {elapsed:.1f}s elapsed")
+
+def main(workers=8, batch_size=100, checkpoint=DEFAULT_CHECKPOINT, reset=False):
     connection = get_db_connection()
     if not connection:
         return
@@ -110,27 +201,75 @@ def main():
     cursor.execute("SELECT * FROM book_categories")
     categories = cursor.fetchall()
     
-    for category in categories:
-        print(f"\nPopulating books for category: {category['name']}")
-        subjects = CATEGORY_SUBJECTS.get(category['name'], [category['name'].lower()])
+    if reset and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    completed = load_checkpoint(checkpoint)
+    tasks = [task for task in build_tasks(categories) if task[0] not in completed]
+    if completed:
+        print(f"Resuming from {checkpoint}: {len(completed)} fetches already done")
+    
+    progress = Progress(len(tasks))
+    pending_rows = []
+    pending_tasks = []
+    
+    def flush():
+        # Commit the buffered rows, then record their tasks as done
+        if pending_rows:
+            progress.inserted += insert_books(cursor, pending_rows)
+        connection.commit()
+        completed.update(pending_tasks)
+        save_checkpoint(checkpoint, completed)
+        pending_rows.clear()
+        pending_tasks.clear()
+        progress.report()
+    
+    try:
+        # Workers only fetch; all database writes stay on this thread
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(fetch_task, subject, provider): (key, category)
+                for key, category, subject, provider in tasks
+            }
+            for future in as_completed(futures):
+                key, category = futures[future]
+                progress.done_tasks += 1
+                try:
+                    books = future.result()
+                except Exception as e:
+                    # Left out of the checkpoint so the next run retries it
+                    progress.failed_tasks += 1
+                    print(f"Error fetching {key}: {e}")
+                    continue
+                for book in books:
+                    pending_rows.append((book, category['id']))
+                pending_tasks.append(key)
+                if len(pending_rows) >= batch_size:
+                    flush()
+        flush()
         
-        for subject in subjects:
-            # Get books from OpenLibrary
-            open_library_books = get_open_library_books(subject, limit=3)
-            for book in open_library_books:
-                if insert_book(cursor, book, category['id']):
-                    print(f"Added OpenLibrary book: {book['title']}")
-            
-            # Get books from Gutenberg
-            gutenberg_books = get_gutenberg_books(subject, limit=2)
-            for book in gutenberg_books:
-                if insert_book(cursor, book, category['id']):
-                    print(f"Added Gutenberg book: {book['title']}")
+        # Bulk inserts bypass the incremental counters and the catalog cache version
+        stats.rebuild(cursor)
+        catalog_version.bump(cursor)
+        connection.commit()
+    except Error as e:
+        print(f"Error inserting books: {e}")
+        connection.rollback()
+    finally:
+        cursor.close()
+        connection.close()
     
-    connection.commit()
-    cursor.close()
-    connection.close()
+    progress.report(final=True)
     print("\nBook population completed!")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Populate the catalog from Open Library and Gutenberg")
+    parser.add_argument('--workers', type=int, default=8, help="concurrent fetches")
+    parser.add_argument('--batch-size', type=int, default=100, help="rows per insert batch and commit")
+    parser.add_argument('--rate', type=float, default=None, help="requests per second per host")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help="resume file path")
+    parser.add_argument('--reset', action='store_true', help="ignore any existing checkpoint")
+    args = parser.parse_args()
+    if args.rate:
+        rate_limiter.rate = args.rate
+    main(workers=args.workers, batch_size=args.batch_size,
+         checkpoint=args.checkpoint, reset=args.reset)
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import wait
+
+
+class ProviderResult:
+    """Outcome of a single external provider call"""
+
+    def __init__(self, name, data=None, latency=None, error=None, timed_out=False):
+        self.name = name
+        self.data = data
+        self.latency = latency
+        self.error = error
+        self.timed_out = timed_out
+
+    @property
+    def ok(self):
+        return self.error is None and not self.timed_out
+
+    def __repr__(self):
+        return f"<ProviderResult {self.name} ok={self.ok} latency={self.latency}>"
+
+
+def _timed_call(fetch, timeout):
+    started = time.monotonic()
+    try:
+        return fetch(timeout), None, time.monotonic() - started
+    except Exception as e:
+        return None, e, time.monotonic() - started
+
+
+def fan_out(executor, providers, deadline):
+    """Query every provider concurrently and collect whatever finishes before the deadline
+
+    `providers` maps a provider name to a callable taking a timeout in seconds.
+    Results are returned in the same order as `providers`; providers that miss
+    the deadline are reported as timed out and their data is dropped.
+    """
+    started = time.monotonic()
+    futures = {
+        name: executor.submit(_timed_call, fetch, deadline)
+        for name, fetch in providers.items()
+    }
+    wait(futures.values(), timeout=deadline)
+
+    results = []
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            results.append(ProviderResult(name, latency=time.monotonic() - started,
+                                          timed_out=True))
+            continue
+        data, error, latency = future.result()
+        results.append(ProviderResult(name, data=data, latency=latency, error=error))
+    return results
+
+
+def format_timings(results):
+    """Render provider latencies as `name=123ms` pairs for logging"""
+    parts = []
+    for result in results:
+        status = 'timeout' if result.timed_out else ('error' if result.error else 'ok')
+        parts.append(f"{result.name}={result.latency * 1000:.0f}ms({status})")
+    return ' '.join(parts)
@@ -0,0 +1,242 @@
+import mysql.connector
+from mysql.connector import Error
+import os
+import argparse
+import time
+import numpy as np
+import scipy.sparse as sp
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+TOP_N = 12
+ITEM_NEIGHBOURS = 50
+BATCH_SIZE = 2000
+
+# A purchase says more about taste than a borrow
+BORROW_WEIGHT = 1.0
+PURCHASE_WEIGHT = 2.0
+
+# Pairs of books read together by fewer users are treated as noise
+MIN_COOCCURRENCE = 2
+
+
+def get_db_connection():
+    try:
+        connection = mysql.connector.connect(
+            host=os.getenv('MYSQL_HOST', 'localhost'),
+            user=os.getenv('MYSQL_USER', 'root'),
+            password=os.getenv('MYSQL_PASSWORD', ''),
+            database=os.getenv('MYSQL_DB', 'elibrary')
+        )
+        return connection
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
+
+
+def _pairs(cursor, sql):
+    cursor.execute(sql)
+    rows = cursor.fetchall()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs = np.asarray(rows, dtype=np.int64)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def load_interactions(cursor):
+    """Return (user ids, book ids, users x books matrix of interaction weights)"""
+    borrow_users, borrow_books = _pairs(cursor, 'SELECT user_id, book_id FROM borrowed_books')
+    purchase_users, purchase_books = _pairs(cursor, 'SELECT user_id, book_id FROM purchased_books')
+    # Order items repeat most purchases; the maximum below counts each book once per user
+    order_users, order_books = _pairs(cursor, '''
+        SELECT o.user_id, oi.book_id
+        FROM order_items oi
+        JOIN orders o ON o.id = oi.order_id
+    ''')
+
+    users = np.concatenate([borrow_users, purchase_users, order_users])
+    books = np.concatenate([borrow_books, purchase_books, order_books])
+    user_ids, user_rows = np.unique(users, return_inverse=True)
+    book_ids, book_columns = np.unique(books, return_inverse=True)
+    shape = (len(user_ids), len(book_ids))
+
+    def weighted(start, end, weight):
+        rows, columns = user_rows[start:end], book_columns[start:end]
+        matrix = sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)), shape=shape)
+        matrix.data[:] = weight
+        return matrix
+
+    # Repeat interactions with a book count once, at the strongest weight
+    borrows_end = len(borrow_users)
+    matrix = weighted(0, borrows_end, BORROW_WEIGHT).maximum(
+        weighted(borrows_end, len(users), PURCHASE_WEIGHT))
+    return user_ids, book_ids, matrix.tocsr()
+
+
+def item_similarities(matrix, columns, neighbours=ITEM_NEIGHBOURS, batch_size=BATCH_SIZE):
+    """Cosine co-occurrence similarity of each book in `columns` to every book, top `neighbours` per row"""
+    binary = matrix.copy()
+    binary.data[:] = 1
+    binary_csc = binary.tocsc()
+    counts = np.asarray(binary.sum(axis=0)).ravel()
+
+    blocks = []
+    for start in range(0, len(columns), batch_size):
+        batch = columns[start:start + batch_size]
+        cooccurrence = (binary_csc[:, batch].T @ binary).tocsr()
+        cooccurrence.data[cooccurrence.data < MIN_COOCCURRENCE] = 0
+        cooccurrence.eliminate_zeros()
+
+        indptr, indices, data = [0], [], []
+        for i, column in enumerate(batch):
+            lo, hi = cooccurrence.indptr[i], cooccurrence.indptr[i + 1]
+            other = cooccurrence.indices[lo:hi]
+            scores = cooccurrence.data[lo:hi] / np.sqrt(counts[column] * counts[other])
+            mask = other != column
+            other, scores = other[mask], scores[mask]
+            if len(scores) > neighbours:
+                best = np.argpartition(-scores, neighbours)[:neighbours]
+                other, scores = other[best], scores[best]
+            indices.extend(other.tolist())
+            data.extend(scores.tolist())
+            indptr.append(len(indices))
+        blocks.append(sp.csr_matrix((np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int64),
+                                     np.asarray(indptr)), shape=(len(batch), matrix.shape[1])))
+    if not blocks:
+        return sp.csr_matrix((0, matrix.shape[1]), dtype=np.float32)
+    return sp.vstack(blocks).tocsr()
+
+
+def recommend(matrix, rows, columns, similarities, n=TOP_N):
+    """Yield (row, book columns, scores) with the top `n` unseen books for each user row
+
+    A book's score is the user's interaction weights multiplied by its
+    similarity to each book they already have, summed.
+    """
+    history = matrix[rows]
+    scores = (history[:, columns] @ similarities).tocsr()
+    for i, row in enumerate(rows):
+        lo, hi = scores.indptr[i], scores.indptr[i + 1]
+        candidates, values = scores.indices[lo:hi], scores.data[lo:hi]
+        seen = history.indices[history.indptr[i]:history.indptr[i + 1]]
+        mask = ~np.isin(candidates, seen)
+        candidates, values = candidates[mask], values[mask]
+        if len(values) > n:
+            best = np.argpartition(-values, n)[:n]
+            candidates, values = candidates[best], values[best]
+        order = np.argsort(-values, kind='stable')
+        yield row, candidates[order], values[order]
+
+
+def write_recommendations(connection, cursor, user_ids, book_ids, results, computed_at):
+    """Replace the stored recommendations of every user in `results` in one transaction"""
+    users = [int(user_ids[row]) for row, _, _ in results]
+    if not users:
+        return 0
+    cursor.execute(f"DELETE FROM user_recommendations WHERE user_id IN ({', '.join(['%s'] * len(users))})",
+                   users)
+    values = [
+        (int(user_ids[row]), position, int(book_ids[column]), float(score), computed_at)
+        for row, columns, scores in results
+        for position, (column, score) in enumerate(zip(columns, scores))
+    ]
+    if values:
+        # mysql.connector sends this as a single multi-row INSERT
+        cursor.executemany('''
+            INSERT INTO user_recommendations (user_id, position, book_id, score, computed_at)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', values)
+    connection.commit()
+    return len(users)
+
+
+def _active_users(cursor, since):
+    cursor.execute('''
+        SELECT user_id FROM borrowed_books WHERE borrow_date >= %s
+        UNION
+        SELECT user_id FROM purchased_books WHERE purchase_date >= %s
+        UNION
+        SELECT user_id FROM orders WHERE order_date >= %s
+    ''', (since, since, since))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _last_run(cursor):
+    # Kept apart from the recommendation rows, which a run that finds nobody to update never touches
+    cursor.execute("SELECT started_at FROM job_runs WHERE name = 'recommendations'")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _record_run(connection, cursor, started_at):
+    cursor.execute('''
+        INSERT INTO job_runs (name, started_at) VALUES ('recommendations', %s)
+        ON DUPLICATE KEY UPDATE started_at = VALUES(started_at)
+    ''', (started_at,))
+    connection.commit()
+
+
+def update(connection, full=False, n=TOP_N, batch_size=BATCH_SIZE):
+    """Recompute recommendations for every user, or only for users active since the last run
+
+    Incremental runs only build similarity rows for the books in the active
+    users' histories. Other users keep their stored recommendations until the
+    next full rebuild.
+    """
+    cursor = connection.cursor()
+    # Interactions made while the job runs are picked up by the next run
+    cursor.execute('SELECT NOW()')
+    computed_at = cursor.fetchone()[0]
+
+    since = None if full else _last_run(cursor)
+    user_ids, book_ids, matrix = load_interactions(cursor)
+
+    if since is None:
+        rows = np.arange(len(user_ids))
+    else:
+        active = np.asarray(_active_users(cursor, since), dtype=np.int64)
+        rows = np.flatnonzero(np.isin(user_ids, active))
+    if len(rows) == 0:
+        _record_run(connection, cursor, computed_at)
+        cursor.close()
+        return 0
+
+    # Similarity rows are only needed for books somebody being updated has read
+    columns = np.unique(matrix[rows].indices)
+    similarities = item_similarities(matrix, columns, batch_size=batch_size)
+
+    written = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        results = list(recommend(matrix, batch, columns, similarities, n))
+        written += write_recommendations(connection, cursor, user_ids, book_ids, results, computed_at)
+    _record_run(connection, cursor, computed_at)
+    cursor.close()
+    return written
+
+
+def main(full=False, n=TOP_N, batch_size=BATCH_SIZE):
+    connection = get_db_connection()
+    if not connection:
+        return
+
+    started = time.perf_counter()
+    try:
+        written = update(connection, full, n, batch_size)
+        print(f"Updated recommendations for {written} users in {time.perf_counter() - started:.1f}s")
+    except Error as e:
+        print(f"Error computing recommendations: {e}")
+        connection.rollback()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build 'readers like you' recommendations from borrows and purchases")
+    parser.add_argument('--full', action='store_true', help="recompute every user instead of recently active ones")
+    parser.add_argument('--top-n', type=int, default=TOP_N, help="recommendations stored per user")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="users or books per batch")
+    args = parser.parse_args()
+    main(args.full, args.top_n, args.batch_size)
@@ -0,0 +1,229 @@
+import mysql.connector
+from mysql.connector import Error
+import os
+import argparse
+import re
+import time
+import numpy as np
+import scipy.sparse as sp
+from dotenv import load_dotenv
+from catalog_cache import catalog_version
+from catalog_search import STOPWORDS
+
+# Load environment variables
+load_dotenv()
+
+TOP_K = 8
+BATCH_SIZE = 1000
+
+# Title words count three times, description words once and each author's full name twice
+TITLE_WEIGHT = 3
+AUTHOR_WEIGHT = 2
+
+# Terms in fewer than MIN_DF books cannot link two books. Every book holding a
+# term becomes a candidate neighbour of every other, so a batch row's nonzeros
+# grow with the postings of its terms; capping them at MAX_DF books (or
+# MAX_DF_RATIO of the catalog, whichever is lower) keeps the products sparse
+MIN_DF = 2
+MAX_DF = int(os.getenv('RELATED_MAX_DF', 500))
+MAX_DF_RATIO = 0.1
+MIN_SCORE = 0.05
+
+_TOKEN_RE = re.compile(r'[^\W_]{2,}', re.UNICODE)
+
+
+def get_db_connection():
+    try:
+        connection = mysql.connector.connect(
+            host=os.getenv('MYSQL_HOST', 'localhost'),
+            user=os.getenv('MYSQL_USER', 'root'),
+            password=os.getenv('MYSQL_PASSWORD', ''),
+            database=os.getenv('MYSQL_DB', 'elibrary')
+        )
+        return connection
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
+
+
+def _tokens(text):
+    return [token for token in _TOKEN_RE.findall((text or '').lower()) if token not in STOPWORDS]
+
+
+def document_terms(title, authors, description):
+    """Weighted term counts for one book"""
+    counts = {}
+    for token in _tokens(title):
+        counts[token] = counts.get(token, 0) + TITLE_WEIGHT
+    for token in _tokens(description):
+        counts[token] = counts.get(token, 0) + 1
+    for author in (authors or '').split(','):
+        name = ' '.join(_tokens(author))
+        if name:
+            term = f'author:{name}'
+            counts[term] = counts.get(term, 0) + AUTHOR_WEIGHT
+    return counts
+
+
+def build_matrix(cursor):
+    """Return (book ids, L2-normalized TF-IDF matrix with one row per book)"""
+    cursor.execute('SELECT id, title, authors, description FROM books ORDER BY id')
+    ids, indptr, indices, data = [], [0], [], []
+    vocabulary = {}
+    for book_id, title, authors, description in cursor:
+        for term, count in document_terms(title, authors, description).items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            data.append(count)
+        ids.append(book_id)
+        indptr.append(len(indices))
+
+    matrix = sp.csr_matrix(
+        (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+        shape=(len(ids), len(vocabulary))
+    )
+    n = matrix.shape[0]
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    keep = np.flatnonzero((df >= MIN_DF) & (df <= max(MIN_DF, min(MAX_DF, MAX_DF_RATIO * n))))
+    matrix = matrix[:, keep].tocsr()
+
+    # Sublinear term frequency and smoothed inverse document frequency
+    matrix.data = 1 + np.log(matrix.data)
+    idf = np.log((1 + n) / (1 + df[keep])) + 1
+    matrix = (matrix @ sp.diags(idf.astype(np.float32))).tocsr()
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix = (sp.diags(1 / norms) @ matrix).tocsr()
+    return np.asarray(ids), matrix
+
+
+def top_neighbours(similarities, rows, k):
+    """Yield (row, neighbour rows, scores) for each row of a batch similarity matrix"""
+    for i, row in enumerate(rows):
+        start, end = similarities.indptr[i], similarities.indptr[i + 1]
+        columns = similarities.indices[start:end]
+        scores = similarities.data[start:end]
+        mask = (columns != row) & (scores >= MIN_SCORE)
+        columns, scores = columns[mask], scores[mask]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            columns, scores = columns[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        yield row, columns[order], scores[order]
+
+
+def write_neighbours(connection, cursor, ids, neighbours):
+    """Replace the stored neighbours of every book in `neighbours` in one transaction"""
+    book_ids = [int(ids[row]) for row, _, _ in neighbours]
+    if not book_ids:
+        return 0
+    cursor.execute(f"DELETE FROM related_books WHERE book_id IN ({', '.join(['%s'] * len(book_ids))})",
+                   book_ids)
+    values = [
+        (int(ids[row]), position, int(ids[column]), float(score))
+        for row, columns, scores in neighbours
+        for position, (column, score) in enumerate(zip(columns, scores))
+    ]
+    if values:
+        # mysql.connector sends this as a single multi-row INSERT
+        cursor.executemany('''
+            INSERT INTO related_books (book_id, position, related_id, score)
+            VALUES (%s, %s, %s, %s)
+        ''', values)
+    connection.commit()
+    return len(book_ids)
+
+
+def recompute(connection, cursor, ids, matrix, transposed, rows, k, batch_size):
+    written = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        similarities = (matrix[batch] @ transposed).tocsr()
+        written += write_neighbours(connection, cursor, ids, list(top_neighbours(similarities, batch, k)))
+    return written
+
+
+def full_rebuild(connection, k=TOP_K, batch_size=BATCH_SIZE):
+    """Recompute the neighbours of every book"""
+    cursor = connection.cursor()
+    ids, matrix = build_matrix(cursor)
+    transposed = matrix.T.tocsr()
+    written = recompute(connection, cursor, ids, matrix, transposed, np.arange(len(ids)), k, batch_size)
+    catalog_version.bump(cursor)
+    connection.commit()
+    cursor.close()
+    return written
+
+
+def incremental_update(connection, k=TOP_K, batch_size=BATCH_SIZE):
+    """Compute neighbours for books that have none yet, and re-rank the books they displace
+
+    An existing book is recomputed when a new book scores above its current
+    k-th neighbour. Term weights drift as the catalog grows, so run a full
+    rebuild now and then.
+    """
+    cursor = connection.cursor()
+    ids, matrix = build_matrix(cursor)
+    transposed = matrix.T.tocsr()
+    row_of = {int(book_id): row for row, book_id in enumerate(ids)}
+
+    # A book is displaced by any new neighbour above its weakest stored one
+    threshold = np.full(len(ids), MIN_SCORE, dtype=np.float32)
+    known = np.zeros(len(ids), dtype=bool)
+    cursor.execute('SELECT book_id, COUNT(*), MIN(score) FROM related_books GROUP BY book_id')
+    for book_id, count, min_score in cursor.fetchall():
+        row = row_of.get(book_id)
+        if row is not None:
+            known[row] = True
+            if count >= k:
+                threshold[row] = min_score
+
+    # Books with no stored neighbours are new, or matched nothing last time and may now
+    new_rows = np.flatnonzero(~known)
+    if len(new_rows) == 0:
+        cursor.close()
+        return 0
+
+    affected = set()
+    written = 0
+    for start in range(0, len(new_rows), batch_size):
+        batch = new_rows[start:start + batch_size]
+        similarities = (matrix[batch] @ transposed).tocsr()
+        written += write_neighbours(connection, cursor, ids, list(top_neighbours(similarities, batch, k)))
+        displaced = (similarities.data > threshold[similarities.indices]) & known[similarities.indices]
+        affected.update(similarities.indices[displaced].tolist())
+
+    written += recompute(connection, cursor, ids, matrix, transposed,
+                         np.asarray(sorted(affected), dtype=np.int64), k, batch_size)
+    catalog_version.bump(cursor)
+    connection.commit()
+    cursor.close()
+    return written
+
+
+def main(full=False, k=TOP_K, batch_size=BATCH_SIZE):
+    connection = get_db_connection()
+    if not connection:
+        return
+
+    started = time.perf_counter()
+    try:
+        if full:
+            written = full_rebuild(connection, k, batch_size)
+        else:
+            written = incremental_update(connection, k, batch_size)
+        print(f"Updated related books for {written} books in {time.perf_counter() - started:.1f}s")
+    except Error as e:
+        print(f"Error computing related books: {e}")
+        connection.rollback()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute content-similar books for the book page")
+    parser.add_argument('--full', action='store_true', help="recompute every book instead of only new ones")
+    parser.add_argument('--top-k', type=int, default=TOP_K, help="neighbours stored per book")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="books per similarity batch")
+    args = parser.parse_args()
+    main(args.full, args.top_k, args.batch_size)
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from http_client import http_client
+from telemetry import observe_external
+
+# Seconds a response is served as fresh, per provider
+PROVIDER_TTLS = {
+    'openlibrary': int(os.getenv('OPENLIBRARY_CACHE_TTL', 600)),
+    'gutenberg': int(os.getenv('GUTENBERG_CACHE_TTL', 3600)),
+    'google': int(os.getenv('GOOGLE_BOOKS_CACHE_TTL', 300)),
+}
+DEFAULT_TTL = 300
+
+
+def normalize_key(url, params=None):
+    """Build a cache key from a URL and its query parameters, independent of ordering"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((str(k), str(v)) for k, v in params.items() if v is not None)
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        path,
+        urlencode(sorted(query)),
+        ''
+    ))
+
+
+class ResponseCache:
+    """Bounded LRU cache with per-provider TTLs and stale-while-revalidate refresh"""
+
+    def __init__(self, max_entries=512, ttls=None, stale_ttl=3600, refresh_workers=2):
+        self.max_entries = max_entries
+        self.ttls = dict(ttls or {})
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers)
+        self._stats = defaultdict(lambda: defaultdict(int))
+
+    def ttl_for(self, provider):
+        return self.ttls.get(provider, DEFAULT_TTL)
+
+    def get_or_fetch(self, provider, key, fetch):
+        """Return the cached value for `key`, calling `fetch()` on a miss
+
+        Entries past their TTL but within the stale window are returned as-is
+        while a single background refresh replaces them. Failed fetches are
+        never cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = now - stored_at
+                ttl = self.ttl_for(provider)
+                if age < ttl:
+                    self._entries.move_to_end(key)
+                    self._stats[provider]['hits'] += 1
+                    return value
+                if age < ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self._stats[provider]['stale_hits'] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._refresher.submit(self._refresh, provider, key, fetch)
+                    return value
+                del self._entries[key]
+            self._stats[provider]['misses'] += 1
+
+        value = fetch()
+        self._store(provider, key, value)
+        return value
+
+    def _refresh(self, provider, key, fetch):
+        try:
+            self._store(provider, key, fetch())
+            with self._lock:
+                self._stats[provider]['refreshes'] += 1
+        except Exception as e:
+            print(f"Background refresh failed for {key}: {e}")
+            with self._lock:
+                self._stats[provider]['refresh_errors'] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, provider, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats[provider]['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'providers': {name: dict(counts) for name, counts in self._stats.items()},
+            }
+
+
+external_cache = ResponseCache(
+    max_entries=int(os.getenv('EXTERNAL_CACHE_MAX_ENTRIES', 512)),
+    ttls=PROVIDER_TTLS,
+    stale_ttl=int(os.getenv('EXTERNAL_CACHE_STALE_TTL', 3600)),
+)
+
+
+def fetch_json(provider, url, params=None, timeout=None, retry=True):
+    """GET a JSON document from an external catalog through the shared cache
+
+    Pass retry=False when the caller waits under a deadline, so a slow
+    provider is not retried in the background after the caller has moved on.
+    """
+    def fetch():
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = http_client.get(url, params=params, timeout=timeout, retry=retry)
+            response.raise_for_status()
+            data = response.json()
+            outcome = 'ok'
+            return data
+        finally:
+            observe_external(provider, time.perf_counter() - started, outcome)
+
+    return external_cache.get_or_fetch(provider, normalize_key(url, params), fetch)
@@ -16,7 +16,8 @@ CREATE TABLE IF NOT EXISTS users (
     password VARBINARY(255) NOT NULL,
     is_admin BOOLEAN DEFAULT FALSE,
     last_login TIMESTAMP NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_users_last_login (last_login)
 );
 
 CREATE TABLE IF NOT EXISTS books (
@@ -25,14 +26,31 @@ CREATE TABLE IF NOT EXISTS books (
     authors VARCHAR(255),
     description TEXT,
     cover_image VARCHAR(255),
+    -- Resized variants of uploaded covers, filled in by the cover pipeline
+    cover_thumb VARCHAR(255),
+    cover_thumb_webp VARCHAR(255),
+    cover_medium VARCHAR(255),
+    cover_medium_webp VARCHAR(255),
     preview_link VARCHAR(255),
     source ENUM('admin', 'openlibrary', 'gutenberg') DEFAULT 'admin',
     category_id INT,
     price DECIMAL(10, 2) DEFAULT 29.99,
     added_by INT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    description_snippet VARCHAR(160) GENERATED ALWAYS AS (LEFT(description, 160)) STORED,
+    -- Normalized title for deduplicating external imports (NULL for admin books, which may share titles)
+    title_key VARCHAR(255) GENERATED ALWAYS AS (
+        CASE WHEN source = 'admin' THEN NULL ELSE LOWER(TRIM(title)) END
+    ) STORED,
     FOREIGN KEY (category_id) REFERENCES book_categories(id),
-    FOREIGN KEY (added_by) REFERENCES users(id)
+    FOREIGN KEY (added_by) REFERENCES users(id),
+    INDEX idx_books_title (title),
+    INDEX idx_books_created (created_at, id),
+    INDEX idx_books_category_created (category_id, created_at, id),
+    UNIQUE KEY uq_books_source_title (source, title_key),
+    FULLTEXT INDEX ft_books_search (title, authors, description),
+    FULLTEXT INDEX ft_books_title (title),
+    FULLTEXT INDEX ft_books_authors (authors)
 );
 
 -- Orders table (moved before borrowed_books)
@@ -44,7 +62,10 @@ CREATE TABLE IF NOT EXISTS orders (
     payment_details TEXT NOT NULL,
     order_type ENUM('purchase', 'borrow') DEFAULT 'purchase',
     order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id)
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    INDEX idx_orders_date (order_date, id),
+    INDEX idx_orders_user_date (user_id, order_date, id),
+    INDEX idx_orders_type_date (order_type, order_date, id)
 );
 
 -- Order items table
@@ -68,7 +89,8 @@ CREATE TABLE IF NOT EXISTS borrowed_books (
     return_date TIMESTAMP NULL,
     FOREIGN KEY (user_id) REFERENCES users(id),
     FOREIGN KEY (book_id) REFERENCES books(id),
-    FOREIGN KEY (order_id) REFERENCES orders(id)
+    FOREIGN KEY (order_id) REFERENCES orders(id),
+    INDEX idx_borrowed_books_date (borrow_date)
 );
 
 CREATE TABLE IF NOT EXISTS purchased_books (
@@ -78,7 +100,8 @@ CREATE TABLE IF NOT EXISTS purchased_books (
     purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     price DECIMAL(10, 2) NOT NULL,
     FOREIGN KEY (user_id) REFERENCES users(id),
-    FOREIGN KEY (book_id) REFERENCES books(id)
+    FOREIGN KEY (book_id) REFERENCES books(id),
+    INDEX idx_purchased_books_date (purchase_date)
 );
 
 -- Cart table
@@ -89,7 +112,8 @@ CREATE TABLE IF NOT EXISTS cart_items (
     quantity INT DEFAULT 1,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id),
-    FOREIGN KEY (book_id) REFERENCES books(id)
+    FOREIGN KEY (book_id) REFERENCES books(id),
+    UNIQUE KEY uq_cart_user_book (user_id, book_id)
 );
 
 CREATE TABLE IF NOT EXISTS refunds (
@@ -117,6 +141,53 @@ CREATE TABLE IF NOT EXISTS admin_logs (
     FOREIGN KEY (admin_id) REFERENCES users(id)
 );
 
+-- Version counters used to invalidate per-worker caches
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT INTO cache_versions (name, version) VALUES ('catalog', 0), ('categories', 0);
+
+-- Dashboard counters, maintained on write or refreshed as snapshots (see stats.py)
+CREATE TABLE IF NOT EXISTS site_stats (
+    name VARCHAR(50) PRIMARY KEY,
+    value BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Content-similar books for the book page, precomputed by related_books.py
+CREATE TABLE IF NOT EXISTS related_books (
+    book_id INT NOT NULL,
+    position TINYINT UNSIGNED NOT NULL,
+    related_id INT NOT NULL,
+    score FLOAT NOT NULL,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (book_id, position),
+    FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE,
+    FOREIGN KEY (related_id) REFERENCES books(id) ON DELETE CASCADE
+);
+
+-- Per-user "readers like you" recommendations, precomputed by recommendations.py
+CREATE TABLE IF NOT EXISTS user_recommendations (
+    user_id INT NOT NULL,
+    position TINYINT UNSIGNED NOT NULL,
+    book_id INT NOT NULL,
+    score FLOAT NOT NULL,
+    computed_at DATETIME NOT NULL,
+    PRIMARY KEY (user_id, position),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE,
+    INDEX idx_user_recommendations_computed (computed_at)
+);
+
+-- Start time of each offline job's last completed run, which its next incremental run continues from
+CREATE TABLE IF NOT EXISTS job_runs (
+    name VARCHAR(50) PRIMARY KEY,
+    started_at DATETIME NOT NULL
+);
+
 -- Insert default categories
 INSERT INTO book_categories (name, description) VALUES
 ('Fiction', 'Novels, short stories, and other fictional works'),
@@ -135,3 +206,9 @@ VALUES ('admin', 'admin@elibrary.com', SHA2('admin123', 256), TRUE);
 -- Insert default normal user (username: user, password: user123)
 INSERT INTO users (username, email, password, is_admin)
 VALUES ('user', 'user@elibrary.com', SHA2('user123', 256), FALSE);
+
+-- Seed dashboard counters from the default data
+INSERT INTO site_stats (name, value, updated_at) VALUES
+('admin_books', (SELECT COUNT(*) FROM books WHERE source = 'admin'), NOW()),
+('total_users', (SELECT COUNT(*) FROM users), NOW()),
+('active_users_24h', 0, '2000-01-01 00:00:00');
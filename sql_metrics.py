@@ -0,0 +1,111 @@
+import os
+import re
+import time
+from collections import Counter
+
+from flask import g, has_app_context, request
+
+SLOW_QUERY_SECONDS = float(os.getenv('SLOW_QUERY_SECONDS', 0.2))
+REPEATED_QUERY_THRESHOLD = int(os.getenv('REPEATED_QUERY_THRESHOLD', 5))
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    return _WHITESPACE_RE.sub(' ', sql if isinstance(sql, str) else sql.decode('utf-8', 'replace')).strip()
+
+
+class QueryRecorder:
+    """Statement count, DB time, slowest statement and repeats for one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_sql = None
+        self.slowest_time = 0.0
+        self.statements = Counter()
+
+    def record(self, sql, duration, many=False):
+        statement = normalize_sql(sql)
+        self.count += 1
+        self.total_time += duration
+        self.statements[statement] += 1
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_sql = statement
+        if duration >= SLOW_QUERY_SECONDS:
+            kind = 'executemany' if many else 'query'
+            print(f"Slow {kind} ({duration * 1000:.1f}ms): {statement[:500]}")
+
+    def repeated(self, threshold=REPEATED_QUERY_THRESHOLD):
+        """Statements run at least `threshold` times, usually a query inside a loop"""
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+def current_recorder():
+    if not has_app_context():
+        return None
+    if '_query_recorder' not in g:
+        g._query_recorder = QueryRecorder()
+    return g._query_recorder
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute/executemany into the request's QueryRecorder"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _timed(self, method, sql, args, many=False):
+        started = time.perf_counter()
+        try:
+            return method(sql, args)
+        finally:
+            recorder = current_recorder()
+            if recorder is not None:
+                recorder.record(sql, time.perf_counter() - started, many)
+
+    def execute(self, sql, args=None):
+        return self._timed(self._cursor.execute, sql, args)
+
+    def executemany(self, sql, args):
+        return self._timed(self._cursor.executemany, sql, args, many=True)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are instrumented"""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self.raw.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def init_app(app):
+    """Report per-request query stats: N+1 warnings always, response headers in debug mode"""
+
+    @app.after_request
+    def report_queries(response):
+        recorder = g.get('_query_recorder')
+        if recorder is None:
+            return response
+        for sql, count in recorder.repeated():
+            print(f"Repeated query x{count} on {request.method} {request.path}: {sql[:300]}")
+        if app.debug:
+            response.headers['X-DB-Queries'] = str(recorder.count)
+            response.headers['X-DB-Time-ms'] = f"{recorder.total_time * 1000:.1f}"
+            response.headers['X-DB-Slowest-ms'] = f"{recorder.slowest_time * 1000:.1f}"
+            repeated = recorder.repeated()
+            if repeated:
+                response.headers['X-DB-Repeated'] = str(sum(count for _, count in repeated))
+        return response
@@ -0,0 +1,81 @@
+import os
+
+from dotenv import load_dotenv
+
+# Counters kept exactly in step with writes
+ADMIN_BOOKS = 'admin_books'
+TOTAL_USERS = 'total_users'
+# Time-window counters recomputed when their snapshot is older than the interval
+ACTIVE_USERS_24H = 'active_users_24h'
+
+STAT_QUERIES = {
+    ADMIN_BOOKS: "SELECT COUNT(*) FROM books WHERE source = 'admin'",
+    TOTAL_USERS: "SELECT COUNT(*) FROM users",
+    ACTIVE_USERS_24H: "SELECT COUNT(*) FROM users WHERE last_login > DATE_SUB(NOW(), INTERVAL 24 HOUR)",
+}
+SNAPSHOT_STATS = (ACTIVE_USERS_24H,)
+SNAPSHOT_INTERVAL = int(os.getenv('STATS_SNAPSHOT_INTERVAL', 300))
+
+
+def increment(cursor, name, delta=1):
+    """Adjust a counter inside the caller's transaction"""
+    cursor.execute('''
+        UPDATE site_stats SET value = GREATEST(CAST(value AS SIGNED) + %s, 0), updated_at = NOW()
+        WHERE name = %s
+    ''', (delta, name))
+
+
+def decrement_if_exists(cursor, name, exists_sql, params):
+    """Decrement a counter only when `exists_sql` matches a row, before it is deleted"""
+    cursor.execute(f'''
+        UPDATE site_stats SET value = GREATEST(CAST(value AS SIGNED) - 1, 0), updated_at = NOW()
+        WHERE name = %s AND EXISTS ({exists_sql})
+    ''', (name,) + tuple(params))
+
+
+def refresh_snapshots(cursor, max_age=SNAPSHOT_INTERVAL):
+    """Recompute snapshot counters whose value is older than `max_age` seconds
+
+    Each statement is a primary-key no-op while the snapshot is still fresh.
+    """
+    for name in SNAPSHOT_STATS:
+        cursor.execute(f'''
+            UPDATE site_stats SET value = ({STAT_QUERIES[name]}), updated_at = NOW()
+            WHERE name = %s AND updated_at < DATE_SUB(NOW(), INTERVAL %s SECOND)
+        ''', (name, max_age))
+
+
+def read_stats(cursor):
+    """Return {name: row} for every counter in a single query"""
+    cursor.execute('SELECT name, value, updated_at FROM site_stats')
+    columns = [column[0] for column in cursor.description]
+    rows = [row if isinstance(row, dict) else dict(zip(columns, row)) for row in cursor.fetchall()]
+    return {row['name']: row for row in rows}
+
+
+def rebuild(cursor):
+    """Recompute every counter from scratch, e.g. after bulk loads or manual edits"""
+    for name, query in STAT_QUERIES.items():
+        cursor.execute(f'''
+            INSERT INTO site_stats (name, value, updated_at) VALUES (%s, ({query}), NOW())
+            ON DUPLICATE KEY UPDATE value = VALUES(value), updated_at = VALUES(updated_at)
+        ''', (name,))
+
+
+if __name__ == "__main__":
+    import mysql.connector
+
+    load_dotenv()
+    connection = mysql.connector.connect(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        user=os.getenv('MYSQL_USER', 'root'),
+        password=os.getenv('MYSQL_PASSWORD', ''),
+        database=os.getenv('MYSQL_DB', 'elibrary')
+    )
+    cursor = connection.cursor()
+    rebuild(cursor)
+    connection.commit()
+    for name, row in read_stats(cursor).items():
+        print(f"{name}: {row['value']} (as of {row['updated_at']})")
+    cursor.close()
+    connection.close()
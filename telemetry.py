@@ -0,0 +1,87 @@
+"""Request and external-API metrics exposed in Prometheus text format at /metrics
+
+When running several worker processes, point PROMETHEUS_MULTIPROC_DIR at an
+empty, writable directory before starting the workers; /metrics then
+aggregates the samples written by every worker.
+"""
+import os
+import time
+
+from flask import Response, g, got_request_exception, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter,
+                               Histogram, generate_latest, multiprocess)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUESTS = Counter(
+    'elibrary_http_requests_total',
+    'HTTP requests by endpoint, method and status code',
+    ['endpoint', 'method', 'status']
+)
+HTTP_LATENCY = Histogram(
+    'elibrary_http_request_duration_seconds',
+    'HTTP request latency by endpoint and method',
+    ['endpoint', 'method'],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_EXCEPTIONS = Counter(
+    'elibrary_http_exceptions_total',
+    'Unhandled exceptions raised while handling requests',
+    ['endpoint', 'exception']
+)
+EXTERNAL_LATENCY = Histogram(
+    'elibrary_external_request_duration_seconds',
+    'Latency of upstream catalog API calls by provider and outcome',
+    ['provider', 'outcome'],
+    buckets=LATENCY_BUCKETS
+)
+
+
+def observe_external(provider, seconds, outcome='ok'):
+    EXTERNAL_LATENCY.labels(provider=provider, outcome=outcome).observe(seconds)
+
+
+def _endpoint():
+    # The route rule keeps label cardinality bounded (/book/<int:book_id>, not /book/42)
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+
+def _registry():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def init_app(app):
+    """Record request metrics for every route and register the /metrics endpoint"""
+
+    @app.before_request
+    def start_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('_request_started', None)
+        if started is not None:
+            endpoint = _endpoint()
+            HTTP_LATENCY.labels(endpoint=endpoint, method=request.method).observe(
+                time.perf_counter() - started)
+            HTTP_REQUESTS.labels(endpoint=endpoint, method=request.method,
+                                 status=str(response.status_code)).inc()
+        return response
+
+    def record_exception(sender, exception, **extra):
+        HTTP_EXCEPTIONS.labels(endpoint=_endpoint(), exception=type(exception).__name__).inc()
+
+    got_request_exception.connect(record_exception, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        token = os.getenv('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized', status=401)
+        return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)